@@ -0,0 +1,131 @@
+import os
+
+from selenium import webdriver
+
+
+# Recursos que no aportan texto ni elementos clickeables (se bloquean vía DevTools con Network.setBlockedURLs).
+# Es un bloqueo por patrón de URL, no por tipo de recurso: videos y fuentes servidos desde CDNs sin extensión en el URL
+# (por ejemplo, /assets/abc123) no se bloquean; las imágenes en ese caso quedan cubiertas por la preferencia de Chrome.
+# El comodín final es necesario: los patrones se comparan con el URL completo, y los recursos de CDN suelen llevar
+# parámetros (imagen.png?v=3, fuente.woff2#iefix) que un patrón terminado en la extensión no bloquearía
+BLOCKED_RESOURCE_PATTERNS = [
+    "*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.webp*", "*.avif*", "*.svg*", "*.ico*", "*.bmp*", # Imágenes
+    "*.mp4*", "*.webm*", "*.ogg*", "*.mp3*", "*.wav*", "*.m3u8*", # Video y audio
+    "*.woff*", "*.ttf*", "*.otf*", "*.eot*", # Fuentes (*.woff* cubre también .woff2)
+]
+
+# Hosts de publicidad y analítica conocidos
+BLOCKED_HOSTS = [
+    "google-analytics.com", "googletagmanager.com", "googlesyndication.com", "doubleclick.net",
+    "googleadservices.com", "connect.facebook.net", "facebook.com/tr", "analytics.tiktok.com",
+    "hotjar.com", "clarity.ms", "segment.io", "mixpanel.com", "amplitude.com", "newrelic.com",
+    "nr-data.net", "sentry.io", "intercom.io", "fullstory.com", "criteo.com", "taboola.com",
+]
+
+DEFAULT_BROWSER_PROFILE = {
+    'headless': True,
+    'page_load_strategy': 'eager', # No espera imágenes ni subrecursos para entregar el DOM
+    'block_resources': True,
+    'max_heap_mb': 512, # Límite del heap de V8 (JavaScript) por renderer; no limita la memoria total del navegador
+    'window_size': '1366,2000',
+    'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+}
+
+
+def _env_flag(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "si", "sí")
+
+
+def load_browser_profile(**overrides):
+    '''
+    Construye el perfil del navegador a partir de los valores por defecto, las variables de entorno y los parámetros entregados.
+
+    Variables de entorno:
+    - BROWSER_HEADLESS (bool), BROWSER_PAGE_LOAD_STRATEGY (str), BROWSER_BLOCK_RESOURCES (bool), BROWSER_MAX_HEAP_MB (int).
+
+    max_heap_mb se aplica con --max-old-space-size, que solo limita el heap de V8 de cada renderer: el DOM, las imágenes
+    decodificadas, la GPU y el proceso del navegador quedan fuera, por lo que la memoria residual (RSS) total puede superarlo.
+    Un límite a nivel de proceso (RLIMIT_AS) no sirve para Chrome, que reserva grandes rangos de memoria virtual al iniciar;
+    para acotar la memoria real se debe limitar el contenedor o cgroup del worker.
+
+    Parámetros:
+    - overrides: Valores que reemplazan a los del perfil.
+
+    Retorna:
+    - profile (dict): Perfil del navegador.
+    '''
+
+    profile = dict(DEFAULT_BROWSER_PROFILE)
+    profile['headless'] = _env_flag("BROWSER_HEADLESS", profile['headless'])
+    profile['page_load_strategy'] = os.getenv("BROWSER_PAGE_LOAD_STRATEGY", profile['page_load_strategy'])
+    profile['block_resources'] = _env_flag("BROWSER_BLOCK_RESOURCES", profile['block_resources'])
+    profile['max_heap_mb'] = int(os.getenv("BROWSER_MAX_HEAP_MB", profile['max_heap_mb']))
+    profile.update(overrides)
+    return profile
+
+
+def build_chrome_options(profile):
+    '''
+    Traduce un perfil de navegador a opciones de Chrome.
+
+    Parámetros:
+    - profile (dict): Perfil del navegador.
+
+    Retorna:
+    - options (ChromeOptions): Opciones para webdriver.Chrome.
+    '''
+
+    options = webdriver.ChromeOptions()
+    options.page_load_strategy = profile['page_load_strategy']
+
+    if profile['headless']:
+        options.add_argument("--headless=new")
+
+    # Proceso liviano: sin extensiones, GPU ni servicios en segundo plano
+    for arg in ["--disable-extensions", "--disable-gpu", "--disable-dev-shm-usage", "--no-first-run",
+                "--disable-background-networking", "--disable-sync", "--disable-default-apps",
+                "--mute-audio", "--renderer-process-limit=2"]:
+        options.add_argument(arg)
+
+    options.add_argument(f"--window-size={profile['window_size']}")
+    options.add_argument(f"--user-agent={profile['user_agent']}")
+
+    if profile['max_heap_mb']: # Solo el heap de V8 (ver load_browser_profile)
+        options.add_argument(f"--js-flags=--max-old-space-size={int(profile['max_heap_mb'])}")
+
+    if profile['block_resources']:
+        # Respaldo a nivel de preferencias, solo para imágenes (también las cargadas por CSS o sin extensión).
+        # Audio, video y fuentes se bloquean únicamente con los patrones de URL de start_driver
+        options.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2,
+        })
+
+    return options
+
+
+def start_driver(profile=None):
+    '''
+    Inicia un Chrome con el perfil indicado y, si corresponde, activa el bloqueo de recursos vía DevTools.
+
+    Parámetros:
+    - profile (dict): Perfil del navegador (por defecto, load_browser_profile()).
+
+    Retorna:
+    - driver (WebDriver): Instancia de Chrome.
+    '''
+
+    profile = profile or load_browser_profile()
+    driver = webdriver.Chrome(options=build_chrome_options(profile))
+
+    if profile['block_resources']:
+        blocked = BLOCKED_RESOURCE_PATTERNS + [f"*{host}*" for host in BLOCKED_HOSTS]
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": blocked})
+        except Exception as exc:
+            print(f"No se pudo activar el bloqueo de recursos: {exc}")
+
+    return driver
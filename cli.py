@@ -0,0 +1,44 @@
+import importlib
+import sys
+
+
+# Cada subcomando importa su módulo solo al ejecutarse, para que el arranque no pague dependencias de otras etapas
+COMMANDS = {
+    'qr-decode': ('get_url_qr', 'main', 'Decodifica los códigos QR de las imágenes de cartas.'),
+    'scrape': ('scraping_controller', 'main', 'Extrae el texto de las cartas a partir de los URLs obtenidos.'),
+    'record': ('replay_driver', 'record_main', 'Graba una sesión de extracción interactiva contra un sitio real.'),
+    'replay': ('replay_driver', 'replay_main', 'Reproduce y perfila una grabación sin navegador.'),
+    'match': ('product_matching', 'main', 'Busca los productos del catálogo en las cartas extraídas.'),
+}
+
+
+def usage():
+    lines = ["Uso: python cli.py <comando> [opciones]", "", "Comandos:"]
+    lines += [f"  {name:<12}{description}" for name, (_, _, description) in COMMANDS.items()]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    '''
+    Despacha el subcomando indicado a la función de entrada del módulo correspondiente.
+
+    Parámetros:
+    - argv (list): Argumentos de línea de comandos (por defecto, sys.argv[1:]).
+
+    Retorna:
+    - int: Código de salida.
+    '''
+
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in COMMANDS:
+        print(usage())
+        return 0 if argv and argv[0] in ("-h", "--help") else 2
+
+    module_name, function_name, _ = COMMANDS[argv[0]]
+    module = importlib.import_module(module_name)
+    getattr(module, function_name)(argv[1:])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,21 +4,14 @@ import unicodedata
 
 from bs4 import BeautifulSoup
 
-import requests
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.common.exceptions import ElementClickInterceptedException, ElementNotInteractableException, StaleElementReferenceException
-from selenium.webdriver.common.by import By
-from rapidfuzz import fuzz 
-
-try:
-    import truststore
-    truststore.inject_into_ssl()
-except Exception:
-    pass
+# Selenium se importa dentro de las funciones interactivas: normalize_text y classic_extraction no lo requieren
 
 BANNED_DOMAINS = ["whatsapp.com","facebook.com","instagram.com","twitter.com","tiktok.com","youtube.com","wix.com","x.com","wa.me","wa.link","linkedin.com","messenger.com","snapchat.com","drive.google.com/?tab=oo","play.google.com", "workspace.google.com", "linktr.ee/products", "linktr.ee/s/", "support.google.com", "linktr.ee/blog", "linktr.ee/help", "threads.com", "linktr.ee/universal-login", "linktr.ee/?utm_source=linktree", "linktr.ee/discover", "linktr.ee/forgot-username", "about.google", "firebase.google.com", "firebase.studio", "medium.com"] # !!!!! Un modelo aquí y abajo podrían ser muy útiles
 BANNED_TERMS = ['whatsapp', 'facebook', 'instagram', 'twitter', 'tiktok', 'youtube', 'wix', 'acceder', 'iniciar sesion', 'registrarse', 'suscribirse', 'comprar', 'pagar', 'donar', 'descargar', 'contacto', 'contactanos', 'contacta', 'llamanos', 'mensajeria', 'messenger', 'linkedin', 'snapchat', 'google drive', 'play store']
 
+PRICE_PATTERN = r"(?:[$€₲]|(?:CLP|USD|EUR|COP|ARS|UYU|BOL|PYG))?\s?(\d{1,3}([.,]\d{3}\s?)*[.,]\d{2,3}|(\d\s?){3,})\s*(?:[$€₲]|(?:CLP|USD|EUR|COP|ARS|UYU|BOL|PYG))?" # Exp. regular relajada para detección de precios
+
+
 def normalize_text(text):
     '''
     Normaliza el texto para facilitar la comparación y extracción.
@@ -147,10 +140,8 @@ def classic_extraction(soup): # En proceso de mejora
 
     compact_text = normalize_text(soup.get_text(strip=True)) # Texto completo normalizado
 
-    price_pattern = r"(?:[$€₲]|(?:CLP|USD|EUR|COP|ARS|UYU|BOL|PYG))?\s?(\d{1,3}([.,]\d{3}\s?)*[.,]\d{2,3}|(\d\s?){3,})\s*(?:[$€₲]|(?:CLP|USD|EUR|COP|ARS|UYU|BOL|PYG))?" # Exp. regular relajada para detección de precios
-
     # Conteo de precios y palabras clave en el texto
-    matches = list(re.finditer(price_pattern, compact_text, flags=re.IGNORECASE))
+    matches = list(re.finditer(PRICE_PATTERN, compact_text, flags=re.IGNORECASE))
     price_count = len(matches)
 
     # Conteo de presencia de productos clave en el texto
@@ -175,7 +166,7 @@ def classic_extraction(soup): # En proceso de mejora
     #     if not clean_block or len(clean_block) < MIN_LENGTH:
     #         continue
 
-    #     block_matches = list(re.finditer(price_pattern, clean_block, flags=re.IGNORECASE)) # Búsqueda de precios en el bloque
+    #     block_matches = list(re.finditer(PRICE_PATTERN, clean_block, flags=re.IGNORECASE)) # Búsqueda de precios en el bloque
 
     #     if block_matches:
     #         sub_items = split_multi_item_block(clean_block, block_matches) # División en sub-items si hay múltiples precios en el bloque
@@ -193,6 +184,62 @@ def classic_extraction(soup): # En proceso de mejora
     # }
 
 
+def pause(driver, seconds):
+    '''
+    Espera un tiempo fijo para que la página termine de reaccionar. Con un driver de reproducción (ver replay_driver) no espera.
+
+    Parámetros:
+    - driver (WebDriver): Instancia de Selenium WebDriver o de reproducción.
+    - seconds (float): Tiempo de espera en segundos.
+    '''
+
+    if not getattr(driver, 'is_replay', False):
+        time.sleep(seconds)
+
+
+def wait_until(driver, condition, timeout=10):
+    '''
+    Espera hasta que la condición se cumpla o se agote el tiempo (WebDriverWait).
+    Con un driver de reproducción, la condición se evalúa una sola vez, ya que el estado grabado no cambia por sí solo.
+
+    Parámetros:
+    - driver (WebDriver): Instancia de Selenium WebDriver o de reproducción.
+    - condition (callable): Función que recibe el driver y retorna un valor verdadero cuando se cumple.
+    - timeout (float): Tiempo máximo de espera en segundos.
+
+    Retorna:
+    - Valor retornado por la condición. Lanza TimeoutException si no se cumple.
+    '''
+
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    if getattr(driver, 'is_replay', False):
+        value = condition(driver)
+        if not value:
+            raise TimeoutException("Condición no cumplida en el estado grabado")
+        return value
+
+    return WebDriverWait(driver, timeout).until(condition)
+
+
+def clock(driver):
+    '''
+    Reloj del presupuesto de tiempo de la extracción interactiva. Si el driver tiene su propio reloj (budget_clock), se usa
+    ese: la grabación registra cada lectura y la reproducción entrega las mismas lecturas, de modo que recorre los mismos
+    pasos que la grabación aunque no espere.
+
+    Parámetros:
+    - driver (WebDriver): Instancia de Selenium WebDriver o de grabación/reproducción.
+
+    Retorna:
+    - float: Tiempo actual en segundos.
+    '''
+
+    budget_clock = getattr(driver, 'budget_clock', None)
+    return budget_clock() if budget_clock is not None else time.time()
+
+
 def is_interactive(element):
     '''
     Determina si un elemento HTML es interactivo (clickeable).
@@ -203,6 +250,8 @@ def is_interactive(element):
     Retorna:
     - bool: True si el elemento es interactivo, False en caso contrario.
     '''
+    from selenium.common.exceptions import StaleElementReferenceException
+
     try:
         tag = element.tag_name.lower()
         href = element.get_attribute('href')
@@ -236,6 +285,9 @@ def handle_tag(tag, driver, history):
     Retorna:
     - None
     '''
+    from selenium.common.exceptions import ElementClickInterceptedException, ElementNotInteractableException
+    from selenium.webdriver.common.by import By
+
     valid_references = set()
     final_text = ""
     try:
@@ -286,9 +338,7 @@ def handle_tag(tag, driver, history):
                 continue
 
             try:
-                WebDriverWait(driver, 10).until(
-                    lambda d: d.find_element(By.TAG_NAME, "body").get_attribute("innerHTML") != old_html
-                )
+                wait_until(driver, lambda d: d.find_element(By.TAG_NAME, "body").get_attribute("innerHTML") != old_html)
 
             except Exception:
                 continue
@@ -338,6 +388,8 @@ def interactive_extraction(driver, max_time=60, history=None, depth=0): # En pro
         - text (str): Texto completo del segmento del producto.
     '''
 
+    from selenium.webdriver.common.by import By
+
     # Inicialización
     url = driver.current_url
     soup = BeautifulSoup(driver.page_source, 'html.parser')
@@ -368,16 +420,16 @@ def interactive_extraction(driver, max_time=60, history=None, depth=0): # En pro
     step_size = 500
     current_position = 0
     total_height = driver.execute_script("return document.body.scrollHeight")
-    start = time.time()
+    start = clock(driver)
 
-    while time.time() - start < max_time:
+    while clock(driver) - start < max_time:
         current_position += step_size # El scroll desplaza la página en step_size píxeles
         if current_position >= total_height:
             break
         
         # Scroll hacia abajo
         driver.execute_script(f"window.scrollTo(0, {current_position});")
-        time.sleep(1)
+        pause(driver, 1)
 
         # Actualización de la altura total si es mayor
         new_height = driver.execute_script("return document.body.scrollHeight")
@@ -393,13 +445,11 @@ def interactive_extraction(driver, max_time=60, history=None, depth=0): # En pro
                         old_html = driver.find_element(By.TAG_NAME, "body").get_attribute("innerHTML")
                         driver.get(ref)
                         try:
-                            WebDriverWait(driver, 10).until(
-                                lambda d: d.find_element(By.TAG_NAME, "body").get_attribute("innerHTML") != old_html
-                            )
+                            wait_until(driver, lambda d: d.find_element(By.TAG_NAME, "body").get_attribute("innerHTML") != old_html)
 
                         except Exception:
                             continue
-                        sub_scrap = html_handler(driver, max_time - (time.time() - start), history, depth + 1)
+                        sub_scrap = html_handler(driver, max_time - (clock(driver) - start), history, depth + 1)
                         actual['recognized'] = actual['recognized'] or sub_scrap['recognized']
                         if sub_scrap['full_text'] in actual['full_text']:
                             continue
@@ -436,7 +486,7 @@ def html_handler(driver, max_time=60, history=None, depth=0): # Incompleta, pote
         - price (str): Precio del producto.
         - text (str): Texto completo del segmento del producto.
     '''
-    time.sleep(2)
+    pause(driver, 2)
     scrap = classic_extraction(BeautifulSoup(driver.page_source, 'html.parser'))
     if not scrap['recognized'] or history:
         scrap = interactive_extraction(driver, max_time, history, depth)
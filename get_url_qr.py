@@ -1,19 +1,47 @@
+import argparse
+import re
 import tempfile
 from uuid import uuid4
 from urllib.parse import urlparse, unquote
 from pathlib import Path
 from contextlib import redirect_stderr, contextmanager
-import requests
-import pandas as pd
-import cv2
-from pyzbar.pyzbar import decode
-from dotenv import load_dotenv
+from functools import lru_cache
 import os
-from google.cloud import storage
 import time
+from concurrent.futures import ThreadPoolExecutor
 
-client = storage.Client.from_service_account_json("credentials.json")
-bucket = client.bucket("read-image-storage-qr")
+# Las dependencias pesadas (cv2, pyzbar, pandas, requests, google.cloud) se importan dentro de las funciones que las usan,
+# de modo que importar este módulo no requiera credenciales ni pague su tiempo de carga
+
+CREDENTIALS_FILE = "credentials.json"
+
+# Parámetros del modo de decodificación por mosaicos (tiles)
+TILED_MIN_SIDE = 1600 # Lado mínimo (px) a partir del cual la imagen se divide en mosaicos
+TILE_SIZE = 800 # Lado de cada mosaico (px)
+TILE_OVERLAP = 200 # Solapamiento entre mosaicos: todo QR de lado <= TILE_OVERLAP queda completo en algún mosaico
+# Los códigos más grandes que el solapamiento pueden cortarse en los bordes de los mosaicos; esos los recupera la pasada sobre la imagen completa
+
+WHATSAPP_HOSTS = ["wa.me", "wa.link", "api.whatsapp.com", "chat.whatsapp.com", "whatsapp.com"]
+PAYMENT_HOSTS = ["mpago.la", "mpago.li", "flow.cl"]
+PAYMENT_BRANDS = ["mercadopago", "webpay", "transbank", "khipu", "paypal", "sumup"] # Marcas con dominios por país (mercadopago.cl, mercadopago.com.ar, ...)
+SOCIAL_HOSTS = ["instagram.com", "facebook.com", "fb.me", "tiktok.com", "twitter.com", "x.com", "youtube.com", "linkedin.com"]
+
+# Dominio sin esquema (menu.fu.do/resto, www.resto.cl): etiquetas separadas por puntos, TLD alfabético y ruta opcional
+BARE_URL_PATTERN = re.compile(r'^[a-z0-9-]+(\.[a-z0-9-]+)*\.[a-z]{2,}(:\d+)?([/?#]\S*)?$', re.IGNORECASE)
+
+
+@lru_cache(maxsize=1)
+def get_storage_client():
+    '''
+    Crea (una sola vez por proceso) el cliente de Google Cloud Storage.
+
+    Retorna:
+    - client (storage.Client): Cliente autenticado con la cuenta de servicio.
+    '''
+
+    from google.cloud import storage
+
+    return storage.Client.from_service_account_json(os.getenv("GCS_CREDENTIALS", CREDENTIALS_FILE))
 
 
 @contextmanager
@@ -30,16 +58,28 @@ def _silence_stderr_fd():
         os.close(saved_stderr)
 
 
-def safe_decode(img):
-    try:
-        with open(os.devnull, "w") as devnull, redirect_stderr(devnull), _silence_stderr_fd():
-            return decode(img)
-    except Exception:
-        return []
+def valid_image_url(url_or_blob):
+    '''
+    Determina si una referencia de imagen puede descargarse. Los valores vacíos, los NaN de pandas y las rutas con
+    'undefined' (fotos no subidas en el formulario) nunca se podrán descargar, por lo que no tiene sentido reintentarlos.
 
-def fetch_image(url_or_blob):
+    Parámetros:
+    - url_or_blob: Valor de la columna de imagen.
+
+    Retorna:
+    - bool: True si es un URL HTTP(S) con host y sin segmentos 'undefined', 'null' o 'nan'.
+    '''
 
     if not url_or_blob or not isinstance(url_or_blob, str):
+        return False
+    parsed = urlparse(url_or_blob.strip())
+    if parsed.scheme not in ("http", "https") or not parsed.netloc:
+        return False
+    return not any(part.lower() in ("undefined", "null", "nan") for part in parsed.path.split("/"))
+
+def fetch_image(url_or_blob):
+
+    if not valid_image_url(url_or_blob):
         return None
 
     tmp = Path(tempfile.gettempdir()) / f"qr_{uuid4().hex}.img"
@@ -55,7 +95,7 @@ def fetch_image(url_or_blob):
         if bucket_name == "undefined" or blob_path.startswith("undefined"):
             return None
         try:
-            bucket = client.bucket(bucket_name)
+            bucket = get_storage_client().bucket(bucket_name)
             bucket.blob(unquote(blob_path)).download_to_filename(tmp)
             time.sleep(2)
             return tmp
@@ -63,6 +103,8 @@ def fetch_image(url_or_blob):
             print(f"No se pudo bajar desde GCS {bucket_name}/{blob_path}: {exc}")
             return None
 
+    import requests
+
     try:
         resp = requests.get(url_or_blob, timeout=15, headers={"User-Agent": "Mozilla/5.0"})
         resp.raise_for_status()
@@ -74,63 +116,272 @@ def fetch_image(url_or_blob):
         print(f"No se pudo bajar por HTTP {url_or_blob}: {exc}")
         return None
 
-def decode_qr_code(image_with_url):
+def iter_tiles(height, width, tile_size=TILE_SIZE, overlap=TILE_OVERLAP):
     '''
-    Decodifica códigos QR en imágenes dentro de una carpeta, aplicando técnicas de preprocesamiento si la detección inicial falla.
+    Genera las ventanas de mosaicos solapados que cubren una imagen completa.
 
     Parámetros:
-    - folder_path (str): Ruta a la carpeta que contiene las imágenes.
-    
+    - height (int): Alto de la imagen.
+    - width (int): Ancho de la imagen.
+    - tile_size (int): Lado de cada mosaico.
+    - overlap (int): Solapamiento entre mosaicos vecinos.
+
     Retorna:
-    - data (list): Lista de tuplas (nombre_imagen, datos_decodificados).
-        - nombre_imagen (str): Nombre del archivo de imagen.
-        - datos_decodificados (list): Lista de objetos decodificados por pyzbar, o lista vacía si no se detecta ningún código QR.
+    - tiles (list): Lista de tuplas (x, y, ancho, alto) de cada mosaico.
     '''
 
-    # Obtención y procesamiento de cada imagen en la carpeta
-    
+    step = max(tile_size - overlap, 1)
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, step))
+        positions.append(length - tile_size) # El último mosaico se ajusta al borde
+        return positions
+
+    return [(x, y, min(tile_size, width - x), min(tile_size, height - y))
+            for y in starts(height) for x in starts(width)]
+
+
+def _decode_tile(gray, x, y, w, h, upscale=True):
+    '''
+    Decodifica un mosaico de la imagen en escala de grises, con preprocesamiento si la detección inicial falla.
+    Las coordenadas se devuelven en el sistema de la imagen completa.
+
+    Parámetros:
+    - gray (ndarray): Imagen completa en escala de grises.
+    - x, y, w, h (int): Ventana del mosaico.
+    - upscale (bool): Si es True, como último intento se amplía el mosaico al doble.
+
+    Retorna:
+    - detections (list): Lista de diccionarios con 'data', 'type', 'rect' y 'polygon'.
+    '''
+
+    import cv2
+    from pyzbar.pyzbar import decode
+
+    tile = gray[y:y + h, x:x + w]
+    scale = 1
+    decoded = decode(tile)
+
+    # Preprocesamiento progresivo: umbralización adaptativa, aumento de contraste y Otsu
+    if not decoded:
+        thresh = cv2.adaptiveThreshold(tile, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                       cv2.THRESH_BINARY, 11, 2)
+        decoded = decode(thresh)
+
+    if not decoded:
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+        decoded = decode(clahe.apply(tile))
+
+    if not decoded:
+        _, otsu = cv2.threshold(tile, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        decoded = decode(otsu)
+
+    # El aumento de tamaño se aplica solo al mosaico, no a la imagen completa
+    if not decoded and upscale:
+        scale = 2
+        decoded = decode(cv2.resize(tile, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC))
+
+    detections = []
+    for obj in decoded:
+        left, top, width, height = obj.rect
+        detections.append({
+            'data': obj.data.decode("utf-8", errors="replace"),
+            'type': obj.type,
+            'rect': (x + left // scale, y + top // scale, width // scale, height // scale),
+            'polygon': [(x + p.x // scale, y + p.y // scale) for p in obj.polygon],
+        })
+    return detections
+
+
+def _overlaps(rect1, rect2):
+    x1, y1, w1, h1 = rect1
+    x2, y2, w2, h2 = rect2
+    return x1 < x2 + w2 and x2 < x1 + w1 and y1 < y2 + h2 and y2 < y1 + h1
+
+
+def merge_detections(detections):
+    '''
+    Fusiona las detecciones de mosaicos solapados, eliminando duplicados.
+    Dos detecciones son la misma si tienen el mismo contenido y sus cajas se intersectan; códigos iguales en posiciones distintas se conservan.
+
+    Parámetros:
+    - detections (list): Lista de diccionarios con 'data', 'type', 'rect' y 'polygon'.
+
+    Retorna:
+    - merged (list): Lista de detecciones únicas, ordenadas de arriba a abajo y de izquierda a derecha.
+    '''
+
+    merged = []
+    for det in detections:
+        duplicate = False
+        for kept in merged:
+            if kept['data'] == det['data'] and _overlaps(kept['rect'], det['rect']):
+                # Se conserva la caja de mayor área (la del mosaico que contiene el código completo)
+                if det['rect'][2] * det['rect'][3] > kept['rect'][2] * kept['rect'][3]:
+                    kept['rect'], kept['polygon'] = det['rect'], det['polygon']
+                duplicate = True
+                break
+        if not duplicate:
+            merged.append(dict(det))
+
+    merged.sort(key=lambda d: (d['rect'][1], d['rect'][0]))
+    return merged
+
+
+def _host_matches(host, hosts):
+    # Coincidencia exacta o de subdominio (x.com no debe coincidir con menux.com)
+    return any(host == h or host.endswith(f".{h}") for h in hosts)
+
+
+def payload_url(payload):
+    '''
+    Interpreta el contenido de un código QR como URL. Los dominios sin esquema (menu.fu.do/resto) se completan con http://.
+
+    Parámetros:
+    - payload (str): Contenido decodificado del QR.
+
+    Retorna:
+    - url (str): URL con esquema, o None si el contenido no es un URL.
+    '''
+
+    text = (payload or '').strip()
+    if text.lower().startswith(("http://", "https://")):
+        return text
+    if BARE_URL_PATTERN.match(text):
+        return f"http://{text}"
+    return None
+
+
+def classify_qr_payload(payload):
+    '''
+    Clasifica el contenido de un código QR según su uso probable.
+
+    Parámetros:
+    - payload (str): Contenido decodificado del QR.
+
+    Retorna:
+    - kind (str): Una de 'wifi', 'whatsapp', 'payment', 'social', 'menu' (URL candidata a carta) o 'text'.
+    '''
+
+    text = (payload or '').strip()
+    lower = text.lower()
+
+    if lower.startswith("wifi:"):
+        return 'wifi'
+    if lower.startswith("000201"): # Formato EMVCo de QR de pago
+        return 'payment'
+    url = payload_url(lower)
+    if url is None:
+        return 'text'
+
+    host = urlparse(url).hostname or ''
+    if _host_matches(host, WHATSAPP_HOSTS):
+        return 'whatsapp'
+    if _host_matches(host, PAYMENT_HOSTS) or any(label in PAYMENT_BRANDS for label in host.split('.')):
+        return 'payment'
+    if _host_matches(host, SOCIAL_HOSTS):
+        return 'social'
+    return 'menu'
+
+
+def decode_qr_matrix_tiled(matrix, tile_size=TILE_SIZE, overlap=TILE_OVERLAP, workers=None):
+    '''
+    Decodifica todos los códigos QR de una imagen dividiéndola en mosaicos solapados que se procesan en paralelo,
+    junto con una pasada sobre la imagen completa. Permite recuperar códigos pequeños en fotos de alta resolución
+    sin ampliar la imagen completa.
+
+    Parámetros:
+    - matrix (ndarray): Imagen en BGR.
+    - tile_size (int): Lado de cada mosaico.
+    - overlap (int): Solapamiento entre mosaicos.
+    - workers (int): Cantidad de hilos (por defecto, núcleos disponibles).
+
+    Retorna:
+    - results (list): Lista de diccionarios con 'data', 'type', 'rect' (x, y, ancho, alto), 'polygon' y 'kind'.
+    '''
+
+    import cv2
+
+    gray = cv2.cvtColor(matrix, cv2.COLOR_BGR2GRAY)
+    height, width = gray.shape[:2]
+
+    # Imágenes pequeñas: un único mosaico equivale a la imagen completa
+    # Imágenes grandes: pasada sobre la imagen completa (sin ampliar) para los códigos grandes, más los mosaicos para los pequeños
+    if max(height, width) < TILED_MIN_SIDE:
+        jobs = [((0, 0, width, height), True)]
+    else:
+        jobs = [((0, 0, width, height), False)] + [(tile, True) for tile in iter_tiles(height, width, tile_size, overlap)]
+
+    # zbar libera el GIL durante la decodificación, por lo que los hilos usan varios núcleos
+    # stderr se silencia una sola vez alrededor del pool (dup2 no es seguro entre hilos)
+    detections = []
+    with open(os.devnull, "w") as devnull, redirect_stderr(devnull), _silence_stderr_fd():
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            futures = [pool.submit(_decode_tile, gray, *tile, upscale=upscale) for tile, upscale in jobs]
+            for future in futures:
+                try:
+                    detections.extend(future.result())
+                except Exception:
+                    continue
+
+    results = merge_detections(detections)
+    for res in results:
+        res['kind'] = classify_qr_payload(res['data'])
+    return results
+
+
+def decode_qr_code_tiled(image_with_url, tile_size=TILE_SIZE, overlap=TILE_OVERLAP, workers=None, strict=False):
+    '''
+    Descarga una imagen y decodifica todos sus códigos QR mediante mosaicos.
+
+    Parámetros:
+    - image_with_url (str): URL (HTTP o GCS) de la imagen.
+    - tile_size (int): Lado de cada mosaico.
+    - overlap (int): Solapamiento entre mosaicos.
+    - workers (int): Cantidad de hilos.
+    - strict (bool): Si es True, una imagen que no se pudo descargar o leer levanta IOError en lugar de tratarse como
+      imagen sin códigos (para que la cola de tareas la reintente).
+
+    Retorna:
+    - results (list): Lista de detecciones (ver decode_qr_matrix_tiled), o None si no se detecta ningún código QR.
+    '''
+
+    import cv2
+
     file_path = fetch_image(image_with_url)
     if not file_path or not Path(file_path).exists():
+        if strict:
+            raise IOError(f"No se pudo descargar la imagen {image_with_url}")
         return None
 
-    matrix = cv2.imread(str(file_path)) # Obtención de imagen en BGR, NO RGB
+    matrix = cv2.imread(str(file_path))
+    file_path.unlink(missing_ok=True)
     if matrix is None:
-        file_path.unlink(missing_ok=True)
+        if strict:
+            raise IOError(f"No se pudo leer la imagen {image_with_url}")
         return None
 
-    decodedImage = safe_decode(matrix) # Intento inicial de decodificación
-    
-    # Si no se detectó, se aplican técnicas de preprocesamiento
-    if matrix is not None and decodedImage == []:
+    results = decode_qr_matrix_tiled(matrix, tile_size, overlap, workers)
+    return results if results else None
 
-        # Conversión a escala de grises
-        gray = cv2.cvtColor(matrix, cv2.COLOR_BGR2GRAY)
-        decodedImage = safe_decode(gray)
-        
-        # Umbralización adaptativa
-        if decodedImage == []:
-            thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                                        cv2.THRESH_BINARY, 11, 2)
-            decodedImage = safe_decode(thresh)
-        
-        # Aumento de contraste
-        if decodedImage == []:
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-            enhanced = clahe.apply(gray)
-            decodedImage = safe_decode(enhanced)
-        
-        # Umbralización simple (Otsu)
-        if decodedImage == []:
-            _, otsu = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-            decodedImage = safe_decode(otsu)
-        
-        # Aumento de tamaño de la imagen
-        if decodedImage == []:
-            resized = cv2.resize(matrix, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
-            decodedImage = safe_decode(resized)
 
-    file_path.unlink(missing_ok=True) # Eliminación del archivo temporal
-    return decodedImage if decodedImage != [] else None
+def select_menu_url(results):
+    '''
+    Selecciona el URL de carta entre las detecciones de una imagen.
+
+    Parámetros:
+    - results (list): Lista de detecciones clasificadas.
+
+    Retorna:
+    - url (str): Primer contenido clasificado como 'menu' (con esquema, ver payload_url), o None si no hay.
+    '''
+
+    for res in results or []:
+        if res['kind'] == 'menu':
+            return payload_url(res['data'])
+    return None
 
 
 def insert_into_qr_url(fk, url_image, url_link):
@@ -140,6 +391,8 @@ def insert_into_qr_url(fk, url_image, url_link):
         - Si la fk no existe, inserta una nueva fila con nuevo id.
         '''
 
+        import pandas as pd
+
         main_path = Path(__file__).parent
         qr_file_name = "qr_url.csv"
         output_file = main_path / qr_file_name
@@ -169,21 +422,27 @@ def insert_into_qr_url(fk, url_image, url_link):
         df.to_csv(output_file, index=False)
     
 
-def start_qr_lecture():
+def start_qr_lecture(images_name="images.csv", limit=700):
     '''
     Inicia la lectura de códigos QR, para luego almacenar los URLs decodificados en un archivo de texto.
+
+    Parámetros:
+    - images_name (str): Archivo CSV con las imágenes a procesar (columnas 'response_id' y 'f0_').
+    - limit (int): Cantidad máxima de imágenes a procesar.
     '''
 
+    import pandas as pd
+    from dotenv import load_dotenv
+
     load_dotenv() # Carga de variables de entorno desde .env
 
     # Ubicación de la carpeta con imágenes y del archivo de salida
     # EN UNA VERSIÓN MADURA, ESTO NO DEBERÍA SER ASÍ
     main_path = Path(__file__).parent
     qr_file_name = "qr_url.csv"
-    images_name = "images.csv"
     output_file = main_path / qr_file_name
     image_file = main_path / images_name
-    image_df = pd.read_csv(image_file)[:700]
+    image_df = pd.read_csv(image_file)[:limit]
     id = 0
 
     if output_file.exists() and output_file.stat().st_size > 0:
@@ -196,9 +455,98 @@ def start_qr_lecture():
         id += 1
         fk = row['response_id']
         url_with_image = row['f0_']
-        qr_data = decode_qr_code(url_with_image) # Procesamiento de los códigos QR (no controla cantidad de batches, obtiene todos !)
-        url_carta = qr_data[0].data.decode("utf-8") if qr_data is not None else None
+        qr_data = decode_qr_code_tiled(url_with_image) # Procesamiento de todos los códigos QR de la imagen
+        url_carta = select_menu_url(qr_data)
         insert_into_qr_url(fk, url_with_image, url_carta)
 
 
-start_qr_lecture()
\ No newline at end of file
+def enqueue_qr_tasks(queue_path, images_name="images.csv", limit=700):
+    '''
+    Carga las imágenes a procesar en la cola 'qr', para repartir la lectura entre varios workers o máquinas.
+
+    Parámetros:
+    - queue_path (str | Path): Ubicación de la cola de tareas (ver task_queue.open_task_queue).
+    - images_name (str): Archivo CSV con las imágenes (columnas 'response_id' y 'f0_').
+    - limit (int): Cantidad máxima de imágenes.
+
+    Retorna:
+    - inserted (int): Cantidad de tareas nuevas.
+    '''
+
+    import pandas as pd
+
+    from task_queue import open_task_queue
+
+    image_df = pd.read_csv(Path(__file__).parent / images_name)[:limit]
+    tasks = open_task_queue(queue_path)
+    try:
+        return tasks.enqueue_many('qr', (
+            (str(row['response_id']), {'fk': str(row['response_id']), 'url_image': row['f0_']})
+            for _, row in image_df.iterrows()
+        ))
+    finally:
+        tasks.close()
+
+
+def run_qr_worker(queue_path, worker_id=None, poll_seconds=0):
+    '''
+    Consume la cola 'qr': decodifica cada imagen y encola en 'scrape' el URL de carta obtenido.
+    El mismo URL alcanzado desde distintos QR se encola una sola vez.
+
+    Parámetros:
+    - queue_path (str | Path): Ubicación de la cola de tareas (ver task_queue.open_task_queue).
+    - worker_id (str): Identificador del worker.
+    - poll_seconds (float): Espera entre consultas cuando la cola está vacía (0 termina al vaciarse).
+
+    Retorna:
+    - processed (int): Cantidad de imágenes procesadas por este worker.
+    '''
+
+    from task_queue import open_task_queue, run_worker
+
+    tasks = open_task_queue(queue_path)
+
+    def handle(payload, lease):
+        if not valid_image_url(payload['url_image']):
+            # Resultado terminal: la imagen no existe y reintentar no lo cambia
+            return {'url_carta': None, 'codes': [], 'error': f"URL de imagen inválido: {payload['url_image']!r}"}
+
+        qr_data = decode_qr_code_tiled(payload['url_image'], strict=True) # Las fallas de descarga se reintentan
+        url_carta = select_menu_url(qr_data)
+        if url_carta and not lease['lost']:
+            tasks.enqueue('scrape', url_carta, {'name': payload['fk'], 'url': url_carta})
+        return {
+            'url_carta': url_carta,
+            'codes': [{'data': res['data'], 'kind': res['kind'], 'rect': res['rect']} for res in qr_data or []],
+        }
+
+    try:
+        return run_worker(queue_path, 'qr', handle, worker_id, poll_seconds=poll_seconds)
+    finally:
+        tasks.close()
+
+
+def main(argv=None):
+    '''
+    Punto de entrada de línea de comandos de la etapa de lectura de QR (qr-decode).
+    '''
+
+    parser = argparse.ArgumentParser(prog="qr-decode", description="Decodifica los códigos QR de las imágenes de cartas.")
+    parser.add_argument("--images", default="images.csv", help="CSV con las imágenes a procesar")
+    parser.add_argument("--limit", type=int, default=700, help="Cantidad máxima de imágenes")
+    parser.add_argument("--queue", help="Cola de tareas: archivo .sqlite (workers de un host) o carpeta compartida (varias máquinas); sin ella se procesa todo en este proceso")
+    parser.add_argument("--enqueue", action="store_true", help="Solo carga las imágenes en la cola")
+    parser.add_argument("--worker-id", help="Identificador del worker (por defecto, host:pid)")
+    parser.add_argument("--poll", type=float, default=0, help="Segundos de espera cuando la cola está vacía (0 termina)")
+    args = parser.parse_args(argv)
+
+    if args.queue is None:
+        start_qr_lecture(args.images, args.limit)
+    elif args.enqueue:
+        print(f"Tareas encoladas: {enqueue_qr_tasks(args.queue, args.images, args.limit)}")
+    else:
+        print(f"Imágenes procesadas: {run_qr_worker(args.queue, args.worker_id, args.poll)}")
+
+
+if __name__ == "__main__":
+    main()
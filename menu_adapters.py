@@ -0,0 +1,282 @@
+import json
+import re
+from html import escape
+from urllib.parse import urlparse
+
+
+# Extracción sin navegador para hosts de cartas conocidos. Cada host registrado se asocia a un manejador que recibe el URL
+# y la respuesta estática ya descargada, y retorna el mismo diccionario que html_handler ('recognized', 'full_text'), o None
+# si no pudo extraer la carta (en cuyo caso se usa el camino genérico con Selenium).
+# Solo linktree tiene lógica propia de la plataforma. Los hosts de STATIC_MENU_HOSTS usan un manejador genérico
+# (generic_static_menu) que lee el JSON embebido o el HTML estático sin conocer la estructura de cada plataforma: no está
+# verificado contra páginas reales de esos hosts, y si no reconoce la carta se usa el camino con Selenium.
+
+ADAPTERS = []
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,application/json;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'es-ES,es;q=0.9,en;q=0.8',
+}
+
+NAME_KEYS = ('name', 'nombre', 'title', 'titulo', 'label')
+PRICE_KEYS = ('price', 'precio', 'amount', 'valor', 'cost')
+DESCRIPTION_KEYS = ('description', 'descripcion', 'detail', 'detalle')
+
+MAX_FOLLOWED_LINKS = 8 # Enlaces seguidos como máximo desde una página de enlaces (linktree)
+
+STATIC_MENU_HOSTS = ('fu.do', 'queresto.com', 'menuqr.fun') # Hosts de cartas donde se intenta primero la extracción genérica sin navegador
+
+
+def register_adapter(*hosts):
+    '''
+    Registra un manejador para uno o más hosts (incluye sus subdominios).
+
+    Parámetros:
+    - hosts (str): Hosts atendidos por el manejador, por ejemplo 'fu.do'.
+
+    Retorna:
+    - decorador que agrega la función al registro.
+    '''
+
+    def decorator(func):
+        ADAPTERS.append((hosts, func))
+        return func
+    return decorator
+
+
+def find_adapter(url):
+    '''
+    Busca el manejador registrado para el host de un URL.
+
+    Parámetros:
+    - url (str): URL a procesar.
+
+    Retorna:
+    - func (callable): Manejador, o None si el host no tiene uno.
+    '''
+
+    host = (urlparse(url).hostname or '').lower()
+    for hosts, func in ADAPTERS:
+        if any(host == h or host.endswith(f".{h}") for h in hosts):
+            return func
+    return None
+
+
+def run_adapter(url, response):
+    '''
+    Ejecuta el manejador del host de un URL, si existe. Cualquier falla se informa y se trata como ausencia de resultado.
+
+    Parámetros:
+    - url (str): URL a procesar.
+    - response (requests.Response): Respuesta estática de la página.
+
+    Retorna:
+    - scrap (dict): Diccionario con 'recognized' (bool) y 'full_text' (str), o None si se debe usar el camino genérico.
+    '''
+
+    adapter = find_adapter(url)
+    if adapter is None:
+        return None
+
+    try:
+        scrap = adapter(url, response)
+    except Exception as exc:
+        print(f"Manejador {adapter.__name__} falló para {url}: {exc}")
+        return None
+
+    return scrap if scrap and scrap['recognized'] else None
+
+
+def embedded_json(soup):
+    '''
+    Extrae los bloques de datos JSON embebidos en una página: scripts JSON (__NEXT_DATA__, ld+json, etc.) y
+    asignaciones de estado inicial del tipo window.__ESTADO__ = {...}.
+
+    Parámetros:
+    - soup: BeautifulSoup object del HTML.
+
+    Retorna:
+    - blocks (list): Objetos JSON decodificados.
+    '''
+
+    blocks = []
+    decoder = json.JSONDecoder()
+
+    for tag in soup.find_all('script'):
+        content = tag.string or tag.get_text() or ''
+        if not content.strip():
+            continue
+
+        if 'json' in (tag.get('type') or '').lower():
+            try:
+                blocks.append(json.loads(content))
+            except ValueError:
+                pass
+            continue
+
+        for match in re.finditer(r'window\.__[A-Za-z0-9_]+__\s*=\s*', content):
+            try:
+                obj, _ = decoder.raw_decode(content, match.end())
+                blocks.append(obj)
+            except ValueError:
+                continue
+
+    return blocks
+
+
+def _first_value(obj, keys):
+    for key in keys:
+        value = obj.get(key)
+        if isinstance(value, (str, int, float)) and not isinstance(value, bool) and str(value).strip():
+            return str(value).strip()
+    return None
+
+
+def collect_menu_items(obj, items=None):
+    '''
+    Recorre un objeto JSON y recoge los productos: diccionarios con un nombre y un precio
+    (directo, o dentro de 'offers' como en schema.org MenuItem).
+
+    Parámetros:
+    - obj: Objeto JSON decodificado.
+    - items (list): Lista a la que se agregan los productos (uso interno de la recursión).
+
+    Retorna:
+    - items (list): Lista de diccionarios con 'name', 'price' y 'text'.
+    '''
+
+    if items is None:
+        items = []
+
+    if isinstance(obj, dict):
+        name = _first_value(obj, NAME_KEYS)
+        price = _first_value(obj, PRICE_KEYS)
+        if price is None and isinstance(obj.get('offers'), dict):
+            price = _first_value(obj['offers'], PRICE_KEYS)
+
+        if name and price and re.search(r'\d', price):
+            description = _first_value(obj, DESCRIPTION_KEYS) or ''
+            items.append({'name': name, 'price': price, 'text': ' '.join(part for part in (name, description, price) if part)})
+
+        for value in obj.values():
+            if isinstance(value, (dict, list)):
+                collect_menu_items(value, items)
+
+    elif isinstance(obj, list):
+        for value in obj:
+            collect_menu_items(value, items)
+
+    return items
+
+
+def _banned_link(url):
+    # Compara el host completo (o sus subdominios) con BANNED_DOMAINS: por subcadena, 'x.com' vetaría menux.com.
+    # Las entradas con ruta ('linktr.ee/s/') vetan solo los URLs de ese host que comienzan con la ruta
+    from extraction import BANNED_DOMAINS
+
+    parsed = urlparse(url)
+    host = (parsed.hostname or '').lower()
+    rest = (parsed.path + (f"?{parsed.query}" if parsed.query else '')).lstrip('/')
+    for entry in BANNED_DOMAINS:
+        domain, _, prefix = entry.partition('/')
+        if (host == domain or host.endswith(f".{domain}")) and rest.startswith(prefix):
+            return True
+    return False
+
+
+def _items_scrap(items):
+    # Se reutiliza classic_extraction para que el criterio de reconocimiento sea el mismo que en el camino genérico
+    from bs4 import BeautifulSoup
+
+    from extraction import classic_extraction, filter_redundant_items
+
+    items = filter_redundant_items(items)
+    html = ''.join(f"<p>{escape(item['text'])}</p>" for item in items)
+    return classic_extraction(BeautifulSoup(html, 'html.parser'))
+
+
+@register_adapter(*STATIC_MENU_HOSTS)
+def generic_static_menu(url, response):
+    '''
+    Extracción genérica sin navegador de una carta: primero desde los datos JSON embebidos (cualquier objeto con nombre y
+    precio) y, si no hay productos, desde el HTML estático. No depende del formato de ninguna plataforma.
+
+    Parámetros:
+    - url (str): URL de la carta.
+    - response (requests.Response): Respuesta estática de la página.
+
+    Retorna:
+    - diccionario con 'recognized' (bool) y 'full_text' (str).
+    '''
+
+    from bs4 import BeautifulSoup
+
+    from extraction import classic_extraction
+
+    soup = BeautifulSoup(response.text, 'html.parser')
+
+    items = []
+    for block in embedded_json(soup):
+        collect_menu_items(block, items)
+    if items:
+        scrap = _items_scrap(items)
+        if scrap['recognized']:
+            return scrap
+
+    for tag in soup(['script', 'style', 'noscript']):
+        tag.decompose()
+    return classic_extraction(soup)
+
+
+@register_adapter('linktr.ee')
+def linktree_adapter(url, response):
+    '''
+    Páginas de enlaces: se leen los enlaces desde __NEXT_DATA__ y se procesan sin navegador los que no están vetados.
+    '''
+
+    import requests
+    from bs4 import BeautifulSoup
+
+    from extraction import BANNED_TERMS, classic_extraction, normalize_text
+
+    soup = BeautifulSoup(response.text, 'html.parser')
+    data = soup.find('script', id='__NEXT_DATA__')
+    if data is None:
+        return None
+
+    page_props = json.loads(data.get_text()).get('props', {}).get('pageProps', {})
+    links = page_props.get('links') or page_props.get('account', {}).get('links') or []
+
+    out = {'recognized': False, 'full_text': ''}
+    followed = 0
+    for link in links:
+        target, title = link.get('url'), normalize_text(link.get('title') or '')
+        if not target or _banned_link(target) or any(term in title for term in BANNED_TERMS):
+            continue
+        if followed >= MAX_FOLLOWED_LINKS:
+            break
+        followed += 1
+
+        try:
+            sub_response = requests.get(target, timeout=10, headers=HEADERS)
+        except requests.RequestException:
+            continue
+        if sub_response.status_code != 200:
+            continue
+
+        if 'text/html' in sub_response.headers.get('Content-Type', ''):
+            adapter = find_adapter(target)
+            if adapter is not None and adapter is not linktree_adapter:
+                sub_scrap = adapter(target, sub_response)
+            else:
+                sub_scrap = classic_extraction(BeautifulSoup(sub_response.text, 'html.parser'))
+        else:
+            continue # PDFs e imágenes quedan para el camino genérico
+
+        if not sub_scrap or not sub_scrap['full_text']:
+            continue
+        out['recognized'] = out['recognized'] or sub_scrap['recognized']
+        out['full_text'] = f"{out['full_text']}\n{sub_scrap['full_text']}" if out['full_text'] else sub_scrap['full_text']
+
+    return out
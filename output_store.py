@@ -0,0 +1,223 @@
+import hashlib
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS texts (
+    text_hash TEXT PRIMARY KEY,
+    text BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT,
+    name TEXT,
+    url TEXT NOT NULL,
+    final_url TEXT,
+    status INTEGER,
+    content_type TEXT,
+    recognized INTEGER NOT NULL DEFAULT 0,
+    started_at REAL,
+    elapsed REAL,
+    text_hash TEXT REFERENCES texts(text_hash),
+    task_ref TEXT
+);
+CREATE TABLE IF NOT EXISTS page_products (
+    page_id INTEGER NOT NULL REFERENCES pages(id),
+    sku TEXT,
+    product TEXT,
+    brand TEXT,
+    owner TEXT,
+    matched_text TEXT,
+    price TEXT,
+    score REAL,
+    PRIMARY KEY (page_id, sku, product)
+);
+CREATE INDEX IF NOT EXISTS pages_url ON pages(url);
+CREATE INDEX IF NOT EXISTS pages_text_hash ON pages(text_hash);
+'''
+
+# Cada tarea de la cola escribe a lo más una página, aunque se reintente tras perder el lease
+TASK_REF_INDEX = "CREATE UNIQUE INDEX IF NOT EXISTS pages_task_ref ON pages(task_ref)"
+
+
+def open_store(path):
+    '''
+    Abre (o crea) el almacén consolidado de resultados de scraping en SQLite.
+    El modo WAL permite que varios procesos agreguen resultados de forma concurrente.
+
+    Parámetros:
+    - path (str | Path): Ruta del archivo SQLite.
+
+    Retorna:
+    - conn (sqlite3.Connection): Conexión al almacén.
+    '''
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+
+    # Almacenes creados antes de la columna task_ref
+    if 'task_ref' not in {row[1] for row in conn.execute("PRAGMA table_info(pages)")}:
+        conn.execute("ALTER TABLE pages ADD COLUMN task_ref TEXT")
+    conn.execute(TASK_REF_INDEX)
+    return conn
+
+
+def text_hash(text):
+    '''
+    Calcula el hash de contenido de un texto extraído.
+
+    Parámetros:
+    - text (str): Texto a hashear.
+
+    Retorna:
+    - str: Hash SHA-256 en hexadecimal.
+    '''
+
+    return hashlib.sha256((text or '').encode("utf-8")).hexdigest()
+
+
+def save_scrap(conn, url, scrap, name=None, run_id=None, task_ref=None):
+    '''
+    Agrega el resultado de scraping de un URL al almacén.
+    Los textos idénticos (misma carta alcanzada desde distintos QR) se guardan una sola vez, comprimidos.
+    Con task_ref la escritura es idempotente: si la tarea ya guardó su página (por ejemplo, un intento anterior que perdió
+    el lease tras escribir), no se inserta otra fila y se retorna la existente.
+
+    Parámetros:
+    - conn (sqlite3.Connection): Conexión al almacén.
+    - url (str): URL procesado.
+    - scrap (dict): Resultado de url_scraping_controller.
+    - name (str): Identificador de origen (por ejemplo, la imagen del QR).
+    - run_id (str): Identificador de la ejecución.
+    - task_ref (str): Referencia de la tarea de la cola que produjo el resultado (ver task_queue.run_worker), opcional.
+
+    Retorna:
+    - page_id (int): Id de la fila insertada, o de la ya guardada para task_ref.
+    '''
+
+    data = scrap.get('data') or {}
+    text = data.get('full_text') or ''
+    digest = text_hash(text) if text else None
+
+    with conn: # Transacción única por página
+        if digest:
+            conn.execute(
+                "INSERT OR IGNORE INTO texts (text_hash, text) VALUES (?, ?)",
+                (digest, zlib.compress(text.encode("utf-8"))),
+            )
+        cur = conn.execute(
+            '''INSERT OR IGNORE INTO pages
+               (run_id, name, url, final_url, status, content_type, recognized, started_at, elapsed, text_hash, task_ref)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            (
+                run_id,
+                name,
+                url,
+                scrap.get('final_url'),
+                scrap.get('status'),
+                scrap.get('content_type'),
+                int(bool(data.get('recognized'))),
+                scrap.get('started_at', time.time()),
+                scrap.get('elapsed'),
+                digest,
+                task_ref,
+            ),
+        )
+        if cur.rowcount == 0:
+            return conn.execute("SELECT id FROM pages WHERE task_ref = ?", (task_ref,)).fetchone()[0]
+    return cur.lastrowid
+
+
+def save_products(conn, page_id, matches):
+    '''
+    Reemplaza los productos del catálogo encontrados en una página.
+
+    Parámetros:
+    - conn (sqlite3.Connection): Conexión al almacén.
+    - page_id (int): Id de la página.
+    - matches (list): Resultado de product_matching.match_pages para la página.
+    '''
+
+    with conn:
+        conn.execute("DELETE FROM page_products WHERE page_id = ?", (page_id,))
+        conn.executemany(
+            '''INSERT OR REPLACE INTO page_products (page_id, sku, product, brand, owner, matched_text, price, score)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+            [(page_id, m['sku'], m['product'], m['brand'], m['owner'], m['matched_text'], m['price'], m['score']) for m in matches],
+        )
+
+
+def load_text(conn, digest):
+    '''
+    Recupera y descomprime un texto del almacén.
+
+    Parámetros:
+    - conn (sqlite3.Connection): Conexión al almacén.
+    - digest (str): Hash del texto.
+
+    Retorna:
+    - str: Texto almacenado, o None si no existe.
+    '''
+
+    row = conn.execute("SELECT text FROM texts WHERE text_hash = ?", (digest,)).fetchone()
+    return zlib.decompress(row[0]).decode("utf-8") if row else None
+
+
+def iter_pages(conn, recognized_only=True, run_id=None, after_id=None, limit=None, with_text=True):
+    '''
+    Recorre las páginas almacenadas junto con su texto.
+
+    Parámetros:
+    - conn (sqlite3.Connection): Conexión al almacén.
+    - recognized_only (bool): Si es True, solo se entregan páginas reconocidas.
+    - run_id (str): Si se indica, filtra por ejecución.
+    - after_id (int): Si se indica, solo páginas con id mayor (recorrido por rangos).
+    - limit (int): Cantidad máxima de páginas.
+    - with_text (bool): Si es False, no se lee ni descomprime el texto ('full_text' queda en None).
+
+    Retorna:
+    - generador de diccionarios con las columnas de la página y 'full_text'.
+    '''
+
+    query = '''SELECT p.id, p.run_id, p.name, p.url, p.final_url, p.status, p.content_type, p.recognized,
+                      p.started_at, p.elapsed, p.text_hash, {text}
+               FROM pages p'''
+    if with_text:
+        query = query.format(text="t.text") + " LEFT JOIN texts t ON t.text_hash = p.text_hash"
+    else:
+        query = query.format(text="NULL")
+
+    conditions, params = [], []
+    if recognized_only:
+        conditions.append("p.recognized = 1")
+    if run_id is not None:
+        conditions.append("p.run_id = ?")
+        params.append(run_id)
+    if after_id is not None:
+        conditions.append("p.id > ?")
+        params.append(after_id)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY p.id"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    columns = ['id', 'run_id', 'name', 'url', 'final_url', 'status', 'content_type', 'recognized',
+               'started_at', 'elapsed', 'text_hash']
+    for row in conn.execute(query, params):
+        page = dict(zip(columns, row[:-1]))
+        page['recognized'] = bool(page['recognized'])
+        if with_text:
+            page['full_text'] = zlib.decompress(row[-1]).decode("utf-8") if row[-1] is not None else ''
+        else:
+            page['full_text'] = None
+        yield page
@@ -0,0 +1,235 @@
+import hashlib
+import json
+import re
+import sqlite3
+import time
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS page_cache (
+    canonical_url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    fingerprint TEXT,
+    content_type TEXT,
+    final_url TEXT,
+    scrap TEXT NOT NULL,
+    scraped_at REAL NOT NULL,
+    validated_at REAL
+);
+'''
+
+DEFAULT_MAX_AGE = 7 * 24 * 3600 # Pasado este tiempo se vuelve a hacer scraping completo aunque la página parezca igual
+
+TRACKING_PARAMS = re.compile(r'^(utm_\w+|fbclid|gclid|dclid|msclkid|igshid|mc_cid|mc_eid|_ga|_gl)$', re.IGNORECASE)
+
+
+def open_cache(path):
+    '''
+    Abre (o crea) la caché de páginas en SQLite.
+
+    Parámetros:
+    - path (str | Path): Ruta del archivo SQLite.
+
+    Retorna:
+    - conn (sqlite3.Connection): Conexión a la caché.
+    '''
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def canonical_url(url):
+    '''
+    Normaliza un URL para usarlo como clave de caché: esquema y host en minúsculas, sin parámetros de seguimiento
+    (utm_*, fbclid, etc.) y con los parámetros restantes ordenados. El fragmento se descarta, salvo que sea una ruta de
+    SPA ('#/resto' o '#!/resto'): esas cartas comparten el mismo HTML estático y solo se distinguen por el fragmento.
+
+    Parámetros:
+    - url (str): URL a normalizar.
+
+    Retorna:
+    - str: URL canónico.
+    '''
+
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower() or 'http'
+    host = (parts.hostname or '').lower()
+    if parts.port and not ((scheme == 'http' and parts.port == 80) or (scheme == 'https' and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+
+    path = parts.path or '/'
+    if len(path) > 1:
+        path = path.rstrip('/')
+
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not TRACKING_PARAMS.match(k))
+    fragment = parts.fragment if parts.fragment.startswith(('/', '!')) else ''
+    return urlunsplit((scheme, host, path, urlencode(query), fragment))
+
+
+def html_fingerprint(html):
+    '''
+    Calcula una huella del HTML estático que ignora scripts, estilos y espacios, pero conserva el texto visible,
+    los enlaces y los datos JSON embebidos (donde muchas cartas cargan sus productos).
+
+    Parámetros:
+    - html (str): HTML de la página.
+
+    Retorna:
+    - str: Hash SHA-256 en hexadecimal.
+    '''
+
+    from bs4 import BeautifulSoup
+
+    from extraction import normalize_text
+
+    soup = BeautifulSoup(html or '', 'html.parser')
+
+    embedded = [tag.get_text() for tag in soup.find_all('script', type=re.compile(r'json', re.IGNORECASE))]
+    for tag in soup(['script', 'style', 'noscript', 'template']):
+        tag.decompose()
+
+    links = sorted({a.get('href', '') for a in soup.find_all('a')})
+    parts = [normalize_text(soup.get_text(separator=' '))] + links + embedded
+
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def get_cached_page(conn, url, max_age=DEFAULT_MAX_AGE):
+    '''
+    Obtiene la entrada de caché de un URL, si existe, no supera la antigüedad máxima y su extracción fue reconocida.
+    Las extracciones no reconocidas (guardadas por versiones anteriores) no se reutilizan: pudieron venir de una falla
+    transitoria del navegador en una página cuyo HTML estático no cambia.
+
+    Parámetros:
+    - conn (sqlite3.Connection): Conexión a la caché.
+    - url (str): URL consultado.
+    - max_age (float): Antigüedad máxima (segundos desde el último scraping completo).
+
+    Retorna:
+    - entry (dict): Diccionario con 'etag', 'last_modified', 'fingerprint', 'content_type', 'final_url' y 'scrap', o None.
+    '''
+
+    row = conn.execute(
+        '''SELECT etag, last_modified, fingerprint, content_type, final_url, scrap, scraped_at
+           FROM page_cache WHERE canonical_url = ?''',
+        (canonical_url(url),),
+    ).fetchone()
+    if row is None or time.time() - row[6] > max_age:
+        return None
+
+    scrap = json.loads(row[5])
+    if not scrap.get('recognized'):
+        return None
+
+    return {
+        'etag': row[0],
+        'last_modified': row[1],
+        'fingerprint': row[2],
+        'content_type': row[3],
+        'final_url': row[4],
+        'scrap': scrap,
+    }
+
+
+def conditional_headers(entry):
+    '''
+    Construye los encabezados de petición condicional a partir de una entrada de caché.
+
+    Parámetros:
+    - entry (dict): Entrada de caché (o None).
+
+    Retorna:
+    - dict: Encabezados If-None-Match / If-Modified-Since.
+    '''
+
+    headers = {}
+    if entry and entry['etag']:
+        headers['If-None-Match'] = entry['etag']
+    if entry and entry['last_modified']:
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+
+def is_unchanged(entry, response):
+    '''
+    Determina si la respuesta a una petición condicional corresponde a la página en caché.
+
+    Parámetros:
+    - entry (dict): Entrada de caché (o None).
+    - response (requests.Response): Respuesta obtenida.
+
+    Retorna:
+    - bool: True si el servidor respondió 304 o si la huella del HTML estático coincide.
+    '''
+
+    if entry is None:
+        return False
+    if response.status_code == 304:
+        return True
+    return response.status_code == 200 and entry['fingerprint'] == html_fingerprint(response.text)
+
+
+def touch_page(conn, url):
+    '''
+    Registra que la entrada de caché de un URL se validó sin cambios.
+
+    Parámetros:
+    - conn (sqlite3.Connection): Conexión a la caché.
+    - url (str): URL validado.
+    '''
+
+    with conn:
+        conn.execute("UPDATE page_cache SET validated_at = ? WHERE canonical_url = ?", (time.time(), canonical_url(url)))
+
+
+def store_page(conn, url, response, scrap, final_url=None):
+    '''
+    Guarda en caché los validadores, la huella y el resultado de extracción de una página.
+    Solo se guardan las extracciones reconocidas: una falla transitoria (por ejemplo, una SPA que no terminó de cargar)
+    no debe responderse desde la caché hasta que expire.
+
+    Parámetros:
+    - conn (sqlite3.Connection): Conexión a la caché.
+    - url (str): URL procesado.
+    - response (requests.Response): Respuesta de la petición estática.
+    - scrap (dict): Resultado de html_handler.
+    - final_url (str): URL final tras redirecciones y navegación.
+
+    Retorna:
+    - bool: True si la página se guardó.
+    '''
+
+    if not scrap.get('recognized'):
+        return False
+
+    now = time.time()
+    with conn:
+        conn.execute(
+            '''INSERT OR REPLACE INTO page_cache
+               (canonical_url, etag, last_modified, fingerprint, content_type, final_url, scrap, scraped_at, validated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            (
+                canonical_url(url),
+                response.headers.get('ETag'),
+                response.headers.get('Last-Modified'),
+                html_fingerprint(response.text),
+                response.headers.get('Content-Type', '').split(';')[0],
+                final_url,
+                json.dumps(scrap),
+                now,
+                now,
+            ),
+        )
+    return True
@@ -0,0 +1,300 @@
+import argparse
+import csv
+import re
+from collections import Counter, defaultdict
+
+
+# Búsqueda de productos de un catálogo (CCU y competencia) en el texto extraído de las cartas.
+# El texto se divide una sola vez en ventanas (un producto con su precio, o grupos de palabras si no hay precios),
+# un índice de n-gramas descarta los productos sin caracteres en común y rapidfuzz puntúa cada ventana solo contra sus
+# candidatos (con process.cdist y todos los núcleos para las ventanas que comparten candidatos).
+
+NGRAM_SIZE = 3
+MIN_SHARED_NGRAMS = 0.5 # Fracción de los n-gramas del producto que debe aparecer en la ventana para ser candidato
+SCORE_CUTOFF = 85
+WINDOW_WORDS = 4 # Palabras por ventana cuando el texto no tiene precios
+MAX_NAME_WORDS = 10 # Palabras finales del segmento previo a un precio que se consideran nombre del producto
+PAGES_PER_CHUNK = 500 # Páginas leídas del almacén por bloque en la línea de comandos
+
+# Unidades de envase o peso: un número seguido de ellas (330cc, 1,5 lt, 500 g) es parte del nombre, no un precio
+SIZE_UNITS = re.compile(r'\s*(?:cc|cl|ml|lts?|litros?|l|oz|grs?|g|kgs?|kilos?)\b', re.IGNORECASE)
+
+
+def ngrams(text, n=NGRAM_SIZE):
+    '''
+    Obtiene el conjunto de n-gramas de caracteres de un texto normalizado.
+
+    Parámetros:
+    - text (str): Texto normalizado.
+    - n (int): Largo de los n-gramas.
+
+    Retorna:
+    - set: n-gramas del texto (con un espacio de relleno en los extremos).
+    '''
+
+    padded = f" {text} "
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+def build_catalog(rows):
+    '''
+    Construye el catálogo indexado a partir de filas de productos.
+
+    Parámetros:
+    - rows (iterable): Diccionarios con 'sku', 'name' y opcionalmente 'brand', 'owner' y 'aliases' (separados por '|').
+
+    Retorna:
+    - catalog (dict): Diccionario con:
+        - products (list): Productos del catálogo.
+        - choices (list): Nombres y alias normalizados (lo que se compara).
+        - choice_product (list): Índice del producto de cada elemento de choices.
+        - choice_ngrams (list): Cantidad de n-gramas de cada elemento de choices.
+        - index (dict): n-grama -> lista de índices de choices que lo contienen.
+    '''
+
+    from extraction import normalize_text
+
+    catalog = {'products': [], 'choices': [], 'choice_product': [], 'choice_ngrams': [], 'index': defaultdict(list)}
+
+    for row in rows:
+        product = {
+            'sku': (row.get('sku') or '').strip(),
+            'name': (row.get('name') or '').strip(),
+            'brand': (row.get('brand') or '').strip(),
+            'owner': (row.get('owner') or '').strip(),
+        }
+        if not product['name']:
+            continue
+        product_id = len(catalog['products'])
+        catalog['products'].append(product)
+
+        names = [product['name']] + [alias for alias in (row.get('aliases') or '').split('|') if alias.strip()]
+        for name in dict.fromkeys(normalize_text(name) for name in names):
+            if not name:
+                continue
+            choice_id = len(catalog['choices'])
+            grams = ngrams(name)
+            catalog['choices'].append(name)
+            catalog['choice_product'].append(product_id)
+            catalog['choice_ngrams'].append(len(grams))
+            for gram in grams:
+                catalog['index'][gram].append(choice_id)
+
+    return catalog
+
+
+def load_catalog(path):
+    '''
+    Carga el catálogo de productos desde un CSV con columnas sku, name, brand, owner y aliases.
+
+    Parámetros:
+    - path (str | Path): Ruta del CSV.
+
+    Retorna:
+    - catalog (dict): Catálogo indexado (ver build_catalog).
+    '''
+
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return build_catalog(csv.DictReader(f))
+
+
+def text_windows(text):
+    '''
+    Divide el texto de una carta en ventanas a comparar con el catálogo.
+    Si hay precios, cada ventana es un producto (split_multi_item_block); si no, grupos solapados de palabras.
+    Los números seguidos de una unidad de envase (330cc, 1,5 lt) no se toman como precios y quedan en el nombre.
+
+    Parámetros:
+    - text (str): Texto extraído (full_text).
+
+    Retorna:
+    - windows (list): Lista de tuplas (texto_normalizado, precio).
+    '''
+
+    from extraction import PRICE_PATTERN, normalize_text, split_multi_item_block
+
+    text = normalize_text(text)
+    matches = [match for match in re.finditer(PRICE_PATTERN, text, flags=re.IGNORECASE) if not SIZE_UNITS.match(text, match.end())]
+
+    if matches:
+        windows = []
+        for item in split_multi_item_block(text, matches):
+            name = ' '.join(item['name'].split()[-MAX_NAME_WORDS:])
+            if name:
+                windows.append((name, item['price']))
+        return windows
+
+    words = text.split()
+    step = max(WINDOW_WORDS // 2, 1)
+    return [(' '.join(words[i:i + WINDOW_WORDS]), None) for i in range(0, max(len(words) - step, 1), step)]
+
+
+def candidate_choices(catalog, window, min_shared=MIN_SHARED_NGRAMS):
+    '''
+    Prefiltra los elementos del catálogo que comparten suficientes n-gramas con una ventana.
+
+    Parámetros:
+    - catalog (dict): Catálogo indexado.
+    - window (str): Texto normalizado de la ventana.
+    - min_shared (float): Fracción mínima de n-gramas del elemento presentes en la ventana.
+
+    Retorna:
+    - list: Índices de choices candidatos.
+    '''
+
+    hits = Counter()
+    index = catalog['index']
+    for gram in ngrams(window):
+        hits.update(index.get(gram, ()))
+
+    choice_ngrams = catalog['choice_ngrams']
+    return [choice for choice, count in hits.items() if count >= min_shared * choice_ngrams[choice]]
+
+
+def match_windows(catalog, windows, scorer=None, score_cutoff=SCORE_CUTOFF, workers=-1):
+    '''
+    Puntúa un conjunto de ventanas contra sus candidatos del catálogo, y solo contra ellos.
+    Las ventanas repetidas se puntúan una vez y las que comparten conjunto de candidatos se puntúan juntas con cdist.
+
+    Parámetros:
+    - catalog (dict): Catálogo indexado.
+    - windows (list): Textos normalizados de las ventanas.
+    - scorer (callable): Función de similitud de rapidfuzz (por defecto, fuzz.token_set_ratio).
+    - score_cutoff (float): Puntaje mínimo (0-100).
+    - workers (int): Núcleos usados por cdist (-1 usa todos).
+
+    Retorna:
+    - best (list): Para cada ventana, una tupla (índice de choice, puntaje) o None si no hay coincidencia.
+    '''
+
+    from rapidfuzz import fuzz, process
+
+    scorer = scorer or fuzz.token_set_ratio
+    best = [None] * len(windows)
+
+    # Ventanas idénticas (mismo producto en varias cartas) se puntúan una sola vez
+    positions = defaultdict(list)
+    for i, window in enumerate(windows):
+        positions[window].append(i)
+
+    # Agrupación por conjunto de candidatos: cada grupo se compara solo con sus propios candidatos
+    groups = defaultdict(list)
+    for window in positions:
+        candidates = candidate_choices(catalog, window)
+        if candidates:
+            groups[tuple(sorted(candidates))].append(window)
+
+    for candidates, group in groups.items():
+        choices = [catalog['choices'][choice] for choice in candidates]
+
+        if len(group) == 1:
+            hit = process.extractOne(group[0], choices, scorer=scorer, score_cutoff=score_cutoff)
+            results = [(hit[2], hit[1]) if hit else None]
+        else:
+            scores = process.cdist(group, choices, scorer=scorer, score_cutoff=score_cutoff, workers=workers)
+            top = scores.argmax(axis=1)
+            results = [(top[r], scores[r, top[r]]) if scores[r, top[r]] >= score_cutoff else None for r in range(len(group))]
+
+        for window, result in zip(group, results):
+            if result is None:
+                continue
+            hit = (candidates[int(result[0])], int(round(float(result[1]))))
+            for i in positions[window]:
+                best[i] = hit
+
+    return best
+
+
+def match_pages(catalog, texts, score_cutoff=SCORE_CUTOFF, workers=-1):
+    '''
+    Busca los productos del catálogo en el texto de varias cartas a la vez.
+
+    Parámetros:
+    - catalog (dict): Catálogo indexado (ver load_catalog).
+    - texts (list): Textos extraídos (full_text) de cada carta.
+    - score_cutoff (float): Puntaje mínimo (0-100).
+    - workers (int): Núcleos usados por cdist (-1 usa todos).
+
+    Retorna:
+    - matches (list): Para cada texto, lista de diccionarios con 'sku', 'product', 'brand', 'owner', 'matched_text', 'price' y 'score',
+      con un resultado por producto (el de mayor puntaje).
+    '''
+
+    # Todas las ventanas de todas las cartas se puntúan juntas
+    windows, owners = [], []
+    for page, text in enumerate(texts):
+        for window in text_windows(text or ''):
+            windows.append(window)
+            owners.append(page)
+
+    best = match_windows(catalog, [window for window, _ in windows], score_cutoff=score_cutoff, workers=workers)
+
+    per_page = [{} for _ in texts]
+    for (window, price), page, hit in zip(windows, owners, best):
+        if hit is None:
+            continue
+        choice, score = hit
+        product_id = catalog['choice_product'][choice]
+        kept = per_page[page].get(product_id)
+        if kept is None or score > kept['score'] or (score == kept['score'] and kept['price'] is None and price):
+            product = catalog['products'][product_id]
+            per_page[page][product_id] = {
+                'sku': product['sku'],
+                'product': product['name'],
+                'brand': product['brand'],
+                'owner': product['owner'],
+                'matched_text': window,
+                'price': price,
+                'score': score,
+            }
+
+    return [sorted(found.values(), key=lambda m: -m['score']) for found in per_page]
+
+
+def main(argv=None):
+    '''
+    Punto de entrada de línea de comandos (match): busca los productos del catálogo en las páginas del almacén de resultados.
+    '''
+
+    import os
+    from pathlib import Path
+
+    from output_store import iter_pages, load_text, open_store, save_products
+
+    parser = argparse.ArgumentParser(prog="match", description="Busca productos del catálogo en las cartas extraídas.")
+    parser.add_argument("catalog", help="CSV del catálogo (sku, name, brand, owner, aliases)")
+    parser.add_argument("--output", default=os.getenv("SAVE_DATA_PATH"), help="Carpeta del almacén de resultados (por defecto, SAVE_DATA_PATH)")
+    parser.add_argument("--run-id", help="Procesa solo las páginas de una ejecución")
+    parser.add_argument("--cutoff", type=float, default=SCORE_CUTOFF, help="Puntaje mínimo (0-100)")
+    args = parser.parse_args(argv)
+
+    if not args.output:
+        parser.error("Debe indicarse --output o la variable SAVE_DATA_PATH")
+
+    catalog = load_catalog(args.catalog)
+    store = open_store(Path(args.output) / "scraps.sqlite")
+    try:
+        total_pages, total_matches, last_id = 0, 0, 0
+        matched = {} # text_hash -> productos: cada texto distinto se procesa una sola vez
+
+        # Las páginas se recorren por rangos de id y sin texto; solo se descomprimen los textos aún no procesados
+        while True:
+            chunk = list(iter_pages(store, recognized_only=True, run_id=args.run_id, after_id=last_id,
+                                    limit=PAGES_PER_CHUNK, with_text=False))
+            if not chunk:
+                break
+            last_id = chunk[-1]['id']
+
+            new_hashes = [digest for digest in dict.fromkeys(page['text_hash'] for page in chunk) if digest and digest not in matched]
+            results = match_pages(catalog, [load_text(store, digest) for digest in new_hashes], args.cutoff)
+            matched.update(zip(new_hashes, results))
+
+            for page in chunk:
+                matches = matched.get(page['text_hash'], [])
+                save_products(store, page['id'], matches)
+                total_matches += len(matches)
+            total_pages += len(chunk)
+
+        print(f"{total_pages} páginas, {len(matched)} textos distintos, {total_matches} productos encontrados")
+    finally:
+        store.close()
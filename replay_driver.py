@@ -0,0 +1,451 @@
+import argparse
+import gzip
+import hashlib
+import json
+import time
+from pathlib import Path
+
+
+# Grabación y reproducción de sesiones de navegador para perfilar interactive_extraction, handle_tag y html_handler sin red ni Chrome.
+#
+# El archivo grabado modela la página como un grafo de estados:
+# - Cada estado (URL + innerHTML del body) guarda page_source, resultados de scripts y los elementos consultados por localizador.
+# - Cada acción (click, get, back, script sin retorno) que cambió el estado se guarda como transición estado -> acción -> estado.
+# - Cada lectura del reloj del presupuesto de tiempo (extraction.clock) se guarda en orden: la reproducción no espera, pero
+#   entrega las mismas lecturas, por lo que se detiene en el mismo punto que la grabación.
+# La reproducción implementa solo el subconjunto de la API de WebDriver que usa extraction.py.
+
+ARCHIVE_VERSION = 2
+BODY_LOCATOR = "tag name=body"
+
+
+class ReplayMiss(Exception):
+    '''
+    La reproducción consultó algo que no fue grabado (el camino de ejecución divergió de la grabación).
+    '''
+
+
+def _state_key(url, body_html):
+    return hashlib.sha1(f"{url}\0{body_html}".encode("utf-8")).hexdigest()[:16]
+
+
+def _locator(by, value):
+    return f"{by}={value}"
+
+
+def save_archive(archive, path):
+    '''
+    Guarda un archivo de grabación comprimido (JSON + gzip).
+
+    Parámetros:
+    - archive (dict): Grabación producida por RecordingDriver.
+    - path (str | Path): Ruta de destino.
+    '''
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump(archive, f)
+
+
+def load_archive(path):
+    '''
+    Carga un archivo de grabación.
+
+    Parámetros:
+    - path (str | Path): Ruta del archivo.
+
+    Retorna:
+    - archive (dict): Grabación.
+    '''
+
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        archive = json.load(f)
+    if archive.get('version') != ARCHIVE_VERSION:
+        raise ValueError(f"Versión de grabación no soportada: {archive.get('version')}")
+    return archive
+
+
+class RecordingElement:
+    '''
+    Envoltorio de un WebElement real que registra los atributos leídos y el resultado de los clicks.
+    '''
+
+    def __init__(self, recorder, element, state, locator, index):
+        self._recorder = recorder
+        self._element = element
+        self._state = state
+        self._locator = locator
+        self._index = index
+        self._record = recorder._element_record(state, locator, index)
+
+    def _read(self, name, getter):
+        try:
+            value = getter()
+        except Exception as exc:
+            self._record['errors'][name] = type(exc).__name__
+            raise
+        if not (self._locator == BODY_LOCATOR and name == 'attr:innerHTML'): # Ya guardado como 'body' del estado
+            self._record['values'][name] = value
+        return value
+
+    @property
+    def tag_name(self):
+        return self._read('tag_name', lambda: self._element.tag_name)
+
+    @property
+    def text(self):
+        return self._read('text', lambda: self._element.text)
+
+    def get_attribute(self, name):
+        return self._read(f"attr:{name}", lambda: self._element.get_attribute(name))
+
+    def click(self):
+        action = f"click:{self._state}:{self._locator}:{self._index}"
+        try:
+            self._element.click()
+        except Exception as exc:
+            self._record['errors']['click'] = type(exc).__name__
+            raise
+        self._recorder._action(action)
+
+
+class RecordingDriver:
+    '''
+    Envoltorio de un WebDriver real que graba los estados de página, los resultados de clicks y las navegaciones.
+
+    Parámetros:
+    - driver (WebDriver): Instancia de Selenium WebDriver ya posicionada en la página inicial.
+    - max_time (int): Tiempo máximo de extracción interactiva con que se graba (se reutiliza al reproducir).
+    '''
+
+    is_replay = False
+
+    def __init__(self, driver, max_time=60):
+        self._driver = driver
+        self._pending = None # Acción ejecutada cuyo efecto aún no se observa: (estado de origen, acción)
+        self.archive = {'version': ARCHIVE_VERSION, 'start': None, 'max_time': max_time, 'clock': [], 'states': {}, 'transitions': {}}
+        self._current = self._capture()
+        self.archive['start'] = self._current
+
+    def _capture(self):
+        # Identifica el estado actual de la página y, si cambió tras una acción, registra la transición
+        url = self._driver.current_url
+        try:
+            body = self._driver.find_element("tag name", "body").get_attribute("innerHTML") or ''
+        except Exception:
+            body = ''
+        key = _state_key(url, body)
+
+        states = self.archive['states']
+        if key not in states:
+            states[key] = {'url': url, 'body': body, 'page_source': self._driver.page_source, 'scripts': {}, 'elements': {}}
+
+        if self._pending is not None and key != self._pending[0]:
+            origin, action = self._pending
+            self.archive['transitions'].setdefault(origin, {})[action] = key
+            self._pending = None
+
+        self._current = key
+        return key
+
+    def _action(self, action):
+        # Una acción nueva reemplaza a la anterior si esta no produjo cambios
+        self._pending = (self._current, action)
+
+    def budget_clock(self):
+        now = time.time()
+        self.archive['clock'].append(now)
+        return now
+
+    def _element_record(self, state, locator, index):
+        elements = self.archive['states'][state]['elements'].setdefault(locator, [])
+        while len(elements) <= index:
+            elements.append({'values': {}, 'errors': {}})
+        return elements[index]
+
+    @property
+    def current_url(self):
+        return self.archive['states'][self._capture()]['url']
+
+    @property
+    def page_source(self):
+        return self.archive['states'][self._capture()]['page_source']
+
+    def find_elements(self, by, value):
+        state = self._capture()
+        locator = _locator(by, value)
+        elements = self._driver.find_elements(by, value)
+        self.archive['states'][state]['elements'].setdefault(locator, [])
+        return [RecordingElement(self, el, state, locator, i) for i, el in enumerate(elements)]
+
+    def find_element(self, by, value):
+        state = self._capture()
+        locator = _locator(by, value)
+        element = self._driver.find_element(by, value)
+        return RecordingElement(self, element, state, locator, 0)
+
+    def execute_script(self, script, *args):
+        state = self._capture()
+        result = self._driver.execute_script(script, *args)
+        if script.strip().startswith("return"):
+            self.archive['states'][state]['scripts'][script] = result
+        else:
+            self._action(f"script:{script}")
+        return result
+
+    def get(self, url):
+        self._capture()
+        self._driver.get(url)
+        self._action(f"get:{url}")
+
+    def back(self):
+        self._capture()
+        self._driver.back()
+        self._action("back")
+
+    def quit(self):
+        self._driver.quit()
+
+
+class ReplayElement:
+    '''
+    Elemento reproducido desde una grabación.
+    '''
+
+    def __init__(self, replay, state, locator, index, record):
+        self._replay = replay
+        self._state = state
+        self._locator = locator
+        self._index = index
+        self._record = record
+
+    def _read(self, name, default):
+        error = self._record['errors'].get(name)
+        if error:
+            raise self._replay._exception(error)
+        if self._locator == BODY_LOCATOR and name == 'attr:innerHTML':
+            return self._replay._states[self._replay._current]['body'] # El body siempre refleja el estado vigente
+        return self._record['values'].get(name, default)
+
+    @property
+    def tag_name(self):
+        return self._read('tag_name', '')
+
+    @property
+    def text(self):
+        return self._read('text', '')
+
+    def get_attribute(self, name):
+        return self._read(f"attr:{name}", None)
+
+    def click(self):
+        error = self._record['errors'].get('click')
+        if error:
+            raise self._replay._exception(error)
+        self._replay._transition(f"click:{self._state}:{self._locator}:{self._index}")
+
+
+class ReplayDriver:
+    '''
+    Sustituto de WebDriver que reproduce una grabación sin red, sin navegador y sin esperas.
+    Implementa el subconjunto de la API usado por extraction.py.
+
+    Parámetros:
+    - archive (dict): Grabación (ver load_archive).
+    - strict (bool): Si es True, cualquier consulta no grabada levanta ReplayMiss en lugar de solo contarse.
+    '''
+
+    is_replay = True
+
+    def __init__(self, archive, strict=False):
+        self._states = archive['states']
+        self._transitions = archive['transitions']
+        self._current = archive['start']
+        self._clock = iter(archive['clock'])
+        self.strict = strict
+        self.misses = 0 # Consultas no grabadas (divergencias respecto de la grabación)
+
+    def _miss(self, what):
+        self.misses += 1
+        if self.strict:
+            raise ReplayMiss(what)
+
+    def budget_clock(self):
+        # Lecturas grabadas en orden; si se agotan, la reproducción divergió y el presupuesto se da por consumido
+        now = next(self._clock, None)
+        if now is None:
+            self._miss("reloj")
+            return float('inf')
+        return now
+
+    def _exception(self, name):
+        from selenium.common import exceptions
+
+        return getattr(exceptions, name, exceptions.WebDriverException)(f"{name} (reproducido)")
+
+    def _transition(self, action, required=False):
+        target = self._transitions.get(self._current, {}).get(action)
+        if target is None:
+            if required:
+                self._miss(action)
+                raise ReplayMiss(action)
+            return # La acción no cambió la página durante la grabación
+        self._current = target
+
+    @property
+    def current_url(self):
+        return self._states[self._current]['url']
+
+    @property
+    def page_source(self):
+        return self._states[self._current]['page_source']
+
+    def find_elements(self, by, value):
+        locator = _locator(by, value)
+        records = self._states[self._current]['elements'].get(locator)
+        if records is None:
+            self._miss(locator)
+            return []
+        return [ReplayElement(self, self._current, locator, i, record) for i, record in enumerate(records)]
+
+    def find_element(self, by, value):
+        locator = _locator(by, value)
+        if locator == BODY_LOCATOR and locator not in self._states[self._current]['elements']:
+            return ReplayElement(self, self._current, locator, 0, {'values': {}, 'errors': {}}) # El body siempre existe
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise self._exception("NoSuchElementException")
+        return elements[0]
+
+    def execute_script(self, script, *args):
+        if script.strip().startswith("return"):
+            scripts = self._states[self._current]['scripts']
+            if script not in scripts:
+                self._miss(script)
+                raise ReplayMiss(script)
+            return scripts[script]
+        self._transition(f"script:{script}")
+        return None
+
+    def get(self, url):
+        self._transition(f"get:{url}", required=True)
+
+    def back(self):
+        self._transition("back")
+
+    def quit(self):
+        pass
+
+
+def record_url(url, archive_path, max_time=60):
+    '''
+    Ejecuta html_handler contra un sitio real grabando la sesión.
+
+    Parámetros:
+    - url (str): URL a grabar.
+    - archive_path (str | Path): Ruta del archivo de grabación.
+    - max_time (int): Tiempo máximo para la extracción interactiva.
+
+    Retorna:
+    - scrap (dict): Resultado de html_handler durante la grabación.
+    '''
+
+    from selenium.common.exceptions import TimeoutException
+
+    from browser_profile import start_driver
+    from extraction import html_handler, wait_until
+
+    driver = start_driver()
+    try:
+        driver.get(url)
+        try:
+            wait_until(driver, lambda d: len(d.find_element("tag name", "body").get_attribute("innerHTML")) > 1000)
+        except TimeoutException:
+            pass
+
+        recorder = RecordingDriver(driver, max_time)
+        scrap = html_handler(recorder, max_time)
+        save_archive(recorder.archive, archive_path)
+    finally:
+        driver.quit()
+    return scrap
+
+
+def replay_archive(archive_path, max_time=None, repeat=1, profile=False, strict=False):
+    '''
+    Reproduce una grabación con html_handler, midiendo el tiempo y opcionalmente perfilando con cProfile.
+
+    Parámetros:
+    - archive_path (str | Path): Ruta del archivo de grabación.
+    - max_time (int): Tiempo máximo para la extracción interactiva (por defecto, el de la grabación).
+    - repeat (int): Cantidad de repeticiones.
+    - profile (bool): Si es True, imprime las funciones con mayor tiempo acumulado.
+    - strict (bool): Si es True, la reproducción falla con ReplayMiss al divergir de la grabación.
+
+    Retorna:
+    - diccionario con 'scrap' (último resultado), 'elapsed' (lista de tiempos por repetición) y 'misses' (consultas no grabadas).
+    '''
+
+    import cProfile
+    import pstats
+
+    from extraction import html_handler
+
+    archive = load_archive(archive_path)
+    max_time = archive['max_time'] if max_time is None else max_time
+    profiler = cProfile.Profile() if profile else None
+    elapsed, scrap, misses = [], None, 0
+
+    for _ in range(repeat):
+        driver = ReplayDriver(archive, strict)
+        start = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        scrap = html_handler(driver, max_time)
+        if profiler:
+            profiler.disable()
+        elapsed.append(time.perf_counter() - start)
+        misses = driver.misses
+
+    if profiler:
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+
+    return {'scrap': scrap, 'elapsed': elapsed, 'misses': misses}
+
+
+def record_main(argv=None):
+    '''
+    Punto de entrada de línea de comandos para grabar una sesión (record).
+    '''
+
+    parser = argparse.ArgumentParser(prog="record", description="Graba una sesión de extracción interactiva contra un sitio real.")
+    parser.add_argument("url", help="URL a grabar")
+    parser.add_argument("archive", help="Archivo de grabación de salida (.json.gz)")
+    parser.add_argument("--max-time", type=int, default=60, help="Tiempo máximo de extracción interactiva")
+    args = parser.parse_args(argv)
+
+    from scraping_controller import _inject_truststore
+
+    _inject_truststore() # Certificados del sistema, igual que en scrape (la grabación navega contra el sitio real)
+    scrap = record_url(args.url, args.archive, args.max_time)
+    print(f"{args.url}: reconocido {scrap['recognized']}, {len(scrap['full_text'])} caracteres -> {args.archive}")
+
+
+def replay_main(argv=None):
+    '''
+    Punto de entrada de línea de comandos para reproducir y perfilar una grabación (replay).
+    '''
+
+    parser = argparse.ArgumentParser(prog="replay", description="Reproduce una grabación sin navegador para medir y perfilar la extracción.")
+    parser.add_argument("archive", help="Archivo de grabación (.json.gz)")
+    parser.add_argument("--max-time", type=int, help="Tiempo máximo de extracción interactiva (por defecto, el de la grabación)")
+    parser.add_argument("--strict", action="store_true", help="Falla si la reproducción consulta algo no grabado")
+    parser.add_argument("--repeat", type=int, default=1, help="Cantidad de repeticiones")
+    parser.add_argument("--profile", action="store_true", help="Perfila con cProfile")
+    args = parser.parse_args(argv)
+
+    result = replay_archive(args.archive, args.max_time, args.repeat, args.profile, args.strict)
+    best = min(result['elapsed'])
+    print(f"reconocido {result['scrap']['recognized']}, {len(result['scrap']['full_text'])} caracteres, "
+          f"mejor tiempo {best:.3f}s en {args.repeat} repeticiones, {result['misses']} consultas no grabadas")
@@ -1,39 +1,50 @@
+import argparse
 from pathlib import Path
-import requests
 import time
+from uuid import uuid4
 
-from bs4 import BeautifulSoup
+import os
 
-from selenium import webdriver
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.common.exceptions import TimeoutException
+from output_store import open_store, save_scrap
 
-from dotenv import load_dotenv
-import os
+# requests, selenium y extraction se importan al procesar el primer URL, no al importar el módulo
 
-try:
-    import truststore
-    truststore.inject_into_ssl()
-except Exception:
-    pass
 
-from extraction import html_handler
+def _inject_truststore():
+    try:
+        import truststore
+        truststore.inject_into_ssl()
+    except Exception:
+        pass
 
 
-def url_scraping_controller(url): # Incompleta
+def url_scraping_controller(url, cache=None): # Incompleta
     '''
     Realiza scraping de un URL para extraer información útil según su tipo de contenido.
+    Si se entrega una caché, las páginas sin cambios (304, o misma huella de HTML estático) se responden con la extracción
+    guardada, sin abrir el navegador. Los hosts de cartas registrados (ver menu_adapters) también se procesan sin navegador,
+    volviendo al camino genérico si su manejador falla.
 
     Parámetros:
     - url (str): URL a procesar.
+    - cache (sqlite3.Connection): Caché de páginas (ver page_cache.open_cache), opcional.
 
     Retorna:
-    - diccionario con 'status' (int), 'content_type' (str) y 'data' (diccionario con 'recognized' (bool) y 'items' (lista de diccionarios con 'name', 'price' y 'text')).
+    - diccionario con 'status' (int), 'content_type' (str), 'final_url' (str), 'started_at' (float), 'elapsed' (float), 'cached' (bool) y 'data' (diccionario con 'recognized' (bool) y 'items' (lista de diccionarios con 'name', 'price' y 'text')).
         - name (str): Nombre del producto.
         - price (str): Precio del producto.
         - text (str): Texto completo del segmento del producto.
     '''
 
+    import requests
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    from browser_profile import start_driver
+    from extraction import html_handler
+    from menu_adapters import run_adapter
+    from page_cache import conditional_headers, get_cached_page, is_unchanged, store_page, touch_page
+
     # Headers para simular un navegador real y evitar errores
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
@@ -43,67 +54,209 @@ def url_scraping_controller(url): # Incompleta
         'Connection': 'keep-alive',
     }
     
+    started_at = time.time()
     try:
         scrap = {'recognized': False, 'full_text': ''}
-        response = requests.get(url, timeout=10, headers=headers)
-        if response.status_code == 200:
+        entry = get_cached_page(cache, url) if cache is not None else None
+        response = requests.get(url, timeout=10, headers={**headers, **conditional_headers(entry)})
 
-            # Inicialización de Selenium WebDriver (esto debería desplazarlo a interactive_extraction)
-            driver = webdriver.Chrome()
-            driver.get(url)
-            try:
-                WebDriverWait(driver, 10).until(
-                    lambda d: len(d.find_element("tag name", "body").get_attribute("innerHTML")) > 1000
-                )
-            except TimeoutException:
-                pass  # Si no se cumple, sigue igual
-            
-            # Extraer información útil del HTML
+        # Página sin cambios: se reutiliza la extracción anterior, sin trabajo de navegador
+        if is_unchanged(entry, response):
+            touch_page(cache, url)
+            return {'status': response.status_code, 'content_type': entry['content_type'], 'final_url': entry['final_url'],
+                    'started_at': started_at, 'elapsed': time.time() - started_at, 'cached': True, 'data': entry['scrap']}
+
+        if response.status_code == 200:
             content_type = response.headers.get('Content-Type', '').split(';')[0]
+
+            # Hosts de cartas conocidos: extracción desde la respuesta estática (JSON embebido o HTML), sin navegador
             if 'text/html' in content_type:
-                scrap = html_handler(driver)
-            driver.quit()
-            return {'status': response.status_code, 'content_type': content_type, 'data': scrap}
+                adapted = run_adapter(url, response)
+                if adapted is not None:
+                    if cache is not None:
+                        store_page(cache, url, response, adapted, response.url)
+                    return {'status': response.status_code, 'content_type': content_type, 'final_url': response.url,
+                            'started_at': started_at, 'elapsed': time.time() - started_at, 'cached': False, 'data': adapted}
+
+            # Inicialización de Selenium WebDriver con perfil liviano (headless, bloqueo de recursos)
+            driver = start_driver()
+            try:
+                driver.get(url)
+                try:
+                    WebDriverWait(driver, 10).until(
+                        lambda d: len(d.find_element("tag name", "body").get_attribute("innerHTML")) > 1000
+                    )
+                except TimeoutException:
+                    pass  # Si no se cumple, sigue igual
+
+                # Extraer información útil del HTML
+                if 'text/html' in content_type:
+                    scrap = html_handler(driver)
+                final_url = driver.current_url
+            finally:
+                driver.quit() # También ante errores de navegación o extracción, para no dejar procesos de Chrome vivos
+            if cache is not None and 'text/html' in content_type:
+                store_page(cache, url, response, scrap, final_url)
+            return {'status': response.status_code, 'content_type': content_type, 'final_url': final_url,
+                    'started_at': started_at, 'elapsed': time.time() - started_at, 'cached': False, 'data': scrap}
 
 
             ## PENDIENTE: Manejo de otros tipos de contenido (PDF, imágenes, etc.)
 
         else:
-            return {'status': response.status_code, 'content_type': None, 'data': scrap}
+            return {'status': response.status_code, 'content_type': None, 'final_url': response.url,
+                    'started_at': started_at, 'elapsed': time.time() - started_at, 'cached': False, 'data': scrap}
     except requests.RequestException as e:
         print("Error al acceder al enlace:", e)
-        return {'status': None, 'content_type': None, 'data': scrap}
+        return {'status': None, 'content_type': None, 'final_url': None,
+                'started_at': started_at, 'elapsed': time.time() - started_at, 'cached': False, 'data': scrap}
 
 
-load_dotenv() # Carga de variables de entorno desde .env
+def _open_page_cache(save_data_path, use_cache):
+    if not use_cache:
+        return None
 
-# Rutas de entrada y salida !
-# En la práctica, debería requerir extracción del backend de los códigos QR y comunicación vía API para la salida estructurada
-main_path = Path(__file__).parent
-qr_file_name = "qr_url.txt"
-input_file = main_path / qr_file_name
-save_data_path = Path(os.getenv("SAVE_DATA_PATH"))
-save_data_path.mkdir(parents=True, exist_ok=True)
+    from page_cache import open_cache
 
-# Limpieza previa
-for file in save_data_path.glob("*"):
-    if file.is_file():
-        file.unlink()
+    return open_cache(Path(save_data_path) / "page_cache.sqlite")
 
-with open(input_file, "r", encoding="utf-8") as f:
-    for line in f:
-        name, url = [el.strip() for el in line.split(",")]
-        if not url:
-            print(f"{name}: No se detectó dirección URL.")
-            continue
 
-        else:
-            scrap = url_scraping_controller(url) # Scraping del URL, información estructurada en texto plano
-            print(f"{name}: {url} -> scrap: status {scrap['status']}")
-            
-            # Almacenamiento del texto plano en archivo !
-            if scrap['data']['recognized']:
-                output_file = Path(save_data_path) / f"{name}_scrap.txt"
-                with open(output_file, "w", encoding="utf-8") as f:
-                    f.write(f"URL: {url}\n")
-                    f.write(f"Full Text:\n{scrap['data']['full_text']}\n\n")
\ No newline at end of file
+def run_scraping(input_file, save_data_path, use_cache=True):
+    '''
+    Procesa todos los URLs del archivo de entrada y agrega los resultados al almacén consolidado.
+
+    Parámetros:
+    - input_file (str | Path): Archivo con líneas "nombre,url".
+    - save_data_path (str | Path): Carpeta del almacén de resultados.
+    - use_cache (bool): Si es True, las páginas sin cambios desde la ejecución anterior no se vuelven a procesar.
+    '''
+
+    save_data_path = Path(save_data_path)
+    store = open_store(save_data_path / "scraps.sqlite") # Almacén consolidado, se agrega por ejecución (sin limpieza previa)
+    cache = _open_page_cache(save_data_path, use_cache)
+    run_id = uuid4().hex
+
+    with open(input_file, "r", encoding="utf-8") as f:
+        for line in f:
+            name, url = [el.strip() for el in line.split(",")]
+            if not url:
+                print(f"{name}: No se detectó dirección URL.")
+                continue
+
+            else:
+                scrap = url_scraping_controller(url, cache) # Scraping del URL, información estructurada en texto plano
+                print(f"{name}: {url} -> scrap: status {scrap['status']}{' (caché)' if scrap['cached'] else ''}")
+
+                # Almacenamiento del resultado en el almacén consolidado (texto deduplicado por hash)
+                save_scrap(store, url, scrap, name=name, run_id=run_id)
+
+    store.close()
+    if cache is not None:
+        cache.close()
+
+
+def enqueue_scrape_tasks(queue_path, input_file):
+    '''
+    Carga los URLs del archivo de entrada en la cola 'scrape'.
+
+    Parámetros:
+    - queue_path (str | Path): Ubicación de la cola de tareas (ver task_queue.open_task_queue).
+    - input_file (str | Path): Archivo con líneas "nombre,url".
+
+    Retorna:
+    - inserted (int): Cantidad de tareas nuevas.
+    '''
+
+    from task_queue import open_task_queue
+
+    tasks = []
+    with open(input_file, "r", encoding="utf-8") as f:
+        for line in f:
+            name, url = [el.strip() for el in line.split(",")]
+            if url:
+                tasks.append((url, {'name': name, 'url': url}))
+
+    queue = open_task_queue(queue_path)
+    try:
+        return queue.enqueue_many('scrape', tasks)
+    finally:
+        queue.close()
+
+
+def run_scrape_worker(queue_path, save_data_path, worker_id=None, poll_seconds=0, use_cache=True):
+    '''
+    Consume la cola 'scrape' y agrega cada resultado al almacén consolidado.
+    Si el lease se pierde durante el scraping (otro worker tomó la tarea), el resultado se descarta.
+
+    Parámetros:
+    - queue_path (str | Path): Ubicación de la cola de tareas (ver task_queue.open_task_queue).
+    - save_data_path (str | Path): Carpeta del almacén de resultados. El almacén es SQLite: con varias máquinas, cada una
+      debe usar una carpeta en su disco local.
+    - worker_id (str): Identificador del worker.
+    - poll_seconds (float): Espera entre consultas cuando la cola está vacía (0 termina al vaciarse).
+    - use_cache (bool): Si es True, las páginas sin cambios no se vuelven a procesar.
+
+    Retorna:
+    - processed (int): Cantidad de URLs procesados por este worker.
+    '''
+
+    from task_queue import run_worker
+
+    store = open_store(Path(save_data_path) / "scraps.sqlite")
+    cache = _open_page_cache(save_data_path, use_cache)
+    run_id = uuid4().hex
+
+    def handle(payload, lease):
+        scrap = url_scraping_controller(payload['url'], cache)
+        print(f"{payload['name']}: {payload['url']} -> scrap: status {scrap['status']}{' (caché)' if scrap['cached'] else ''}")
+        if lease['lost']:
+            raise RuntimeError("lease perdido, resultado descartado")
+        page_id = save_scrap(store, payload['url'], scrap, name=payload['name'], run_id=run_id, task_ref=lease['task_ref'])
+        return {'page_id': page_id, 'status': scrap['status'], 'recognized': scrap['data']['recognized']}
+
+    try:
+        return run_worker(queue_path, 'scrape', handle, worker_id, poll_seconds=poll_seconds)
+    finally:
+        store.close()
+        if cache is not None:
+            cache.close()
+
+
+def main(argv=None):
+    '''
+    Punto de entrada de línea de comandos de la etapa de scraping (scrape).
+    '''
+
+    from dotenv import load_dotenv
+
+    load_dotenv() # Carga de variables de entorno desde .env
+    _inject_truststore()
+
+    # Rutas de entrada y salida !
+    # En la práctica, debería requerir extracción del backend de los códigos QR y comunicación vía API para la salida estructurada
+    main_path = Path(__file__).parent
+    parser = argparse.ArgumentParser(prog="scrape", description="Extrae el texto de las cartas a partir de los URLs obtenidos de los QR.")
+    parser.add_argument("--input", default=str(main_path / "qr_url.txt"), help="Archivo con líneas nombre,url")
+    parser.add_argument("--output", default=os.getenv("SAVE_DATA_PATH"), help="Carpeta del almacén de resultados (por defecto, SAVE_DATA_PATH)")
+    parser.add_argument("--queue", help="Cola de tareas: archivo .sqlite (workers de un host) o carpeta compartida (varias máquinas); sin ella se procesa todo en este proceso")
+    parser.add_argument("--enqueue", action="store_true", help="Solo carga los URLs de --input en la cola")
+    parser.add_argument("--worker-id", help="Identificador del worker (por defecto, host:pid)")
+    parser.add_argument("--poll", type=float, default=0, help="Segundos de espera cuando la cola está vacía (0 termina)")
+    parser.add_argument("--no-cache", action="store_true", help="Fuerza el scraping completo de todas las páginas")
+    args = parser.parse_args(argv)
+
+    if args.queue and args.enqueue:
+        print(f"Tareas encoladas: {enqueue_scrape_tasks(args.queue, args.input)}")
+        return
+
+    if not args.output:
+        parser.error("Debe indicarse --output o la variable SAVE_DATA_PATH")
+
+    if args.queue:
+        print(f"URLs procesados: {run_scrape_worker(args.queue, args.output, args.worker_id, args.poll, not args.no_cache)}")
+    else:
+        run_scraping(args.input, args.output, not args.no_cache)
+
+
+if __name__ == "__main__":
+    main()
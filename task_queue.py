@@ -0,0 +1,615 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from uuid import uuid4
+
+
+# Colas de tareas con lease para repartir las etapas entre workers. Las etapas usan la interfaz común de open_task_queue,
+# con dos implementaciones:
+# - SQLiteTaskQueue (archivo .sqlite): para los workers de un mismo host. El modo WAL depende de memoria compartida y de
+#   bloqueos locales, por lo que el archivo no debe ubicarse en un sistema de archivos de red (NFS, SMB, discos en la nube).
+# - DirectoryTaskQueue (carpeta): para varias máquinas que montan la misma carpeta compartida. Cada cambio de estado es un
+#   rename atómico de un archivo, por lo que solo un worker gana cada tarea, sin bloqueos entre hosts.
+# Otro backend (por ejemplo, Postgres con SELECT ... FOR UPDATE SKIP LOCKED) solo necesita implementar los mismos métodos.
+
+# Estados de una tarea: pending -> leased -> done | failed (o de vuelta a pending si el lease expira o se reintenta)
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    queue TEXT NOT NULL,
+    task_key TEXT NOT NULL,
+    payload TEXT,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_token TEXT,
+    leased_by TEXT,
+    lease_expires REAL, -- Vencimiento del lease ('leased') o inicio del reintento ('pending')
+    result TEXT,
+    error TEXT,
+    created_at REAL,
+    updated_at REAL,
+    UNIQUE (queue, task_key)
+);
+CREATE INDEX IF NOT EXISTS tasks_ready ON tasks(queue, state, lease_expires);
+CREATE TABLE IF NOT EXISTS queue_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+'''
+
+DEFAULT_LEASE_SECONDS = 300 # Tiempo de visibilidad: si el worker no renueva el lease, la tarea vuelve a estar disponible
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_RETRY_SECONDS = 60 # Espera antes de reintentar una tarea fallida, multiplicada por el número de intentos
+
+
+def open_queue(path):
+    '''
+    Abre (o crea) la base SQLite de una cola de tareas (ver SQLiteTaskQueue).
+    Varios procesos del mismo host pueden consumir la misma cola; el archivo debe estar en un disco local (no en NFS).
+
+    Parámetros:
+    - path (str | Path): Ruta del archivo SQLite.
+
+    Retorna:
+    - conn (sqlite3.Connection): Conexión a la cola.
+    '''
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None) # Transacciones explícitas
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+@contextmanager
+def _immediate(conn):
+    # Toma el bloqueo de escritura al inicio, para que leer y reservar una tarea sea atómico entre procesos
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def enqueue(conn, queue, key, payload=None):
+    '''
+    Agrega una tarea a la cola. Encolar dos veces la misma clave no tiene efecto.
+
+    Parámetros:
+    - conn (sqlite3.Connection): Conexión a la cola.
+    - queue (str): Nombre de la cola (etapa), por ejemplo 'qr' o 'scrape'.
+    - key (str): Clave única de la tarea dentro de la cola.
+    - payload (dict): Datos de la tarea, serializables a JSON.
+
+    Retorna:
+    - bool: True si la tarea se insertó, False si ya existía.
+    '''
+
+    now = time.time()
+    cur = conn.execute(
+        "INSERT OR IGNORE INTO tasks (queue, task_key, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+        (queue, str(key), json.dumps(payload), now, now),
+    )
+    return cur.rowcount == 1
+
+
+def enqueue_many(conn, queue, tasks):
+    '''
+    Agrega varias tareas a la cola en una sola transacción.
+
+    Parámetros:
+    - conn (sqlite3.Connection): Conexión a la cola.
+    - queue (str): Nombre de la cola.
+    - tasks (iterable): Pares (key, payload).
+
+    Retorna:
+    - inserted (int): Cantidad de tareas nuevas.
+    '''
+
+    inserted = 0
+    with _immediate(conn):
+        for key, payload in tasks:
+            inserted += enqueue(conn, queue, key, payload)
+    return inserted
+
+
+def lease_task(conn, queue, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    '''
+    Reserva la siguiente tarea disponible de la cola por un tiempo limitado.
+    Las tareas cuyo lease expiró vuelven a estar disponibles; las que agotaron sus intentos se marcan como fallidas.
+    Las tareas devueltas a la cola por fail_task no se entregan antes de su tiempo de espera.
+
+    Parámetros:
+    - conn (sqlite3.Connection): Conexión a la cola.
+    - queue (str): Nombre de la cola.
+    - worker_id (str): Identificador del worker (por ejemplo, host:pid).
+    - lease_seconds (float): Duración del lease.
+    - max_attempts (int): Cantidad máxima de intentos por tarea.
+
+    Retorna:
+    - task (dict): Diccionario con 'id', 'key', 'payload', 'attempts' y 'lease_token', o None si no hay tareas disponibles.
+    '''
+
+    now = time.time()
+    with _immediate(conn):
+        conn.execute(
+            '''UPDATE tasks SET state = 'failed', error = COALESCE(error, 'lease expirado'), lease_token = NULL, updated_at = ?
+               WHERE queue = ? AND state = 'leased' AND lease_expires < ? AND attempts >= ?''',
+            (now, queue, now, max_attempts),
+        )
+        row = conn.execute(
+            '''SELECT id, task_key, payload, attempts FROM tasks
+               WHERE queue = ? AND ((state = 'pending' AND (lease_expires IS NULL OR lease_expires <= ?))
+                                    OR (state = 'leased' AND lease_expires < ?))
+               ORDER BY id LIMIT 1''',
+            (queue, now, now),
+        ).fetchone()
+        if row is None:
+            return None
+
+        token = uuid4().hex
+        conn.execute(
+            '''UPDATE tasks SET state = 'leased', attempts = attempts + 1, lease_token = ?, leased_by = ?,
+                                lease_expires = ?, updated_at = ?
+               WHERE id = ?''',
+            (token, worker_id, now + lease_seconds, now, row[0]),
+        )
+
+    return {
+        'id': row[0],
+        'key': row[1],
+        'payload': json.loads(row[2]) if row[2] else None,
+        'attempts': row[3] + 1,
+        'lease_token': token,
+    }
+
+
+def heartbeat(conn, task, lease_seconds=DEFAULT_LEASE_SECONDS):
+    '''
+    Renueva el lease de una tarea en curso.
+
+    Parámetros:
+    - conn (sqlite3.Connection): Conexión a la cola.
+    - task (dict): Tarea entregada por lease_task.
+    - lease_seconds (float): Nueva duración del lease, contada desde ahora.
+
+    Retorna:
+    - bool: True si el lease sigue perteneciendo al worker, False si se perdió.
+    '''
+
+    now = time.time()
+    cur = conn.execute(
+        "UPDATE tasks SET lease_expires = ?, updated_at = ? WHERE id = ? AND state = 'leased' AND lease_token = ?",
+        (now + lease_seconds, now, task['id'], task['lease_token']),
+    )
+    return cur.rowcount == 1
+
+
+def complete_task(conn, task, result=None):
+    '''
+    Registra el resultado de una tarea. El registro es idempotente: solo el primer resultado del lease vigente se guarda,
+    y repetir la llamada (o llamarla desde un lease ya reasignado) no sobrescribe nada.
+
+    Parámetros:
+    - conn (sqlite3.Connection): Conexión a la cola.
+    - task (dict): Tarea entregada por lease_task.
+    - result (dict): Resultado serializable a JSON.
+
+    Retorna:
+    - bool: True si este llamado registró el resultado.
+    '''
+
+    cur = conn.execute(
+        '''UPDATE tasks SET state = 'done', result = ?, lease_token = NULL, lease_expires = NULL, updated_at = ?
+           WHERE id = ? AND state = 'leased' AND lease_token = ?''',
+        (json.dumps(result), time.time(), task['id'], task['lease_token']),
+    )
+    return cur.rowcount == 1
+
+
+def fail_task(conn, task, error, max_attempts=DEFAULT_MAX_ATTEMPTS, retry_seconds=DEFAULT_RETRY_SECONDS):
+    '''
+    Libera una tarea que falló: vuelve a la cola si le quedan intentos, o queda como fallida.
+    El reintento se posterga retry_seconds por cada intento ya hecho, para que un error transitorio (caída de red o del
+    servidor de imágenes) alcance a resolverse antes del siguiente intento.
+
+    Parámetros:
+    - conn (sqlite3.Connection): Conexión a la cola.
+    - task (dict): Tarea entregada por lease_task.
+    - error (str): Descripción del error.
+    - max_attempts (int): Cantidad máxima de intentos por tarea.
+    - retry_seconds (float): Espera base antes del reintento.
+
+    Retorna:
+    - bool: True si la tarea se liberó, False si el lease ya no pertenecía al worker.
+    '''
+
+    now = time.time()
+    if task['attempts'] < max_attempts:
+        state, not_before = 'pending', now + retry_seconds * task['attempts'] # En 'pending', lease_expires es el inicio del reintento
+    else:
+        state, not_before = 'failed', None
+    cur = conn.execute(
+        '''UPDATE tasks SET state = ?, error = ?, lease_token = NULL, lease_expires = ?, updated_at = ?
+           WHERE id = ? AND state = 'leased' AND lease_token = ?''',
+        (state, str(error), not_before, now, task['id'], task['lease_token']),
+    )
+    return cur.rowcount == 1
+
+
+def queue_instance_id(conn):
+    '''
+    Obtiene el identificador de esta cola (se genera al usarla por primera vez). Junto con el id de una tarea forma una
+    referencia única entre colas distintas, que las etapas usan para que reescribir el resultado de una tarea no lo duplique.
+
+    Parámetros:
+    - conn (sqlite3.Connection): Conexión a la cola.
+
+    Retorna:
+    - str: Identificador de la cola.
+    '''
+
+    conn.execute("INSERT OR IGNORE INTO queue_meta (key, value) VALUES ('instance_id', ?)", (uuid4().hex,))
+    return conn.execute("SELECT value FROM queue_meta WHERE key = 'instance_id'").fetchone()[0]
+
+
+def next_ready_at(conn, queue):
+    '''
+    Indica cuándo estará disponible la próxima tarea pendiente de una cola (las que esperan un reintento incluidas).
+
+    Parámetros:
+    - conn (sqlite3.Connection): Conexión a la cola.
+    - queue (str): Nombre de la cola.
+
+    Retorna:
+    - float: Instante (time.time) en que la próxima tarea pendiente estará disponible, o None si no hay pendientes.
+    '''
+
+    row = conn.execute("SELECT MIN(COALESCE(lease_expires, 0)) FROM tasks WHERE queue = ? AND state = 'pending'", (queue,))
+    return row.fetchone()[0]
+
+
+def queue_stats(conn, queue):
+    '''
+    Cuenta las tareas de una cola por estado.
+
+    Parámetros:
+    - conn (sqlite3.Connection): Conexión a la cola.
+    - queue (str): Nombre de la cola.
+
+    Retorna:
+    - dict: Cantidad de tareas por estado.
+    '''
+
+    rows = conn.execute("SELECT state, COUNT(*) FROM tasks WHERE queue = ? GROUP BY state", (queue,))
+    return dict(rows.fetchall())
+
+
+class SQLiteTaskQueue:
+    '''
+    Cola de tareas en un archivo SQLite, para los workers de un mismo host. Envuelve las funciones de este módulo.
+
+    Parámetros:
+    - path (str | Path): Ruta del archivo SQLite.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = open_queue(path)
+
+    def enqueue(self, queue, key, payload=None):
+        return enqueue(self.conn, queue, key, payload)
+
+    def enqueue_many(self, queue, tasks):
+        return enqueue_many(self.conn, queue, tasks)
+
+    def lease(self, queue, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        return lease_task(self.conn, queue, worker_id, lease_seconds, max_attempts)
+
+    def heartbeat(self, task, lease_seconds=DEFAULT_LEASE_SECONDS):
+        return heartbeat(self.conn, task, lease_seconds)
+
+    def complete(self, task, result=None):
+        return complete_task(self.conn, task, result)
+
+    def fail(self, task, error, max_attempts=DEFAULT_MAX_ATTEMPTS, retry_seconds=DEFAULT_RETRY_SECONDS):
+        return fail_task(self.conn, task, error, max_attempts, retry_seconds)
+
+    def next_ready(self, queue):
+        return next_ready_at(self.conn, queue)
+
+    def stats(self, queue):
+        return queue_stats(self.conn, queue)
+
+    def instance_id(self):
+        return queue_instance_id(self.conn)
+
+    def close(self):
+        self.conn.close()
+
+
+class DirectoryTaskQueue:
+    '''
+    Cola de tareas en una carpeta compartida (NFS, SMB, etc.), para workers en varias máquinas.
+    El estado de cada tarea es la carpeta y el nombre de un archivo, y cada transición es un os.rename atómico: si dos
+    workers intentan tomar la misma tarea, solo el primer rename tiene éxito. La expiración del lease es la fecha de
+    modificación del archivo reservado, por lo que los relojes de las máquinas deben estar sincronizados (NTP).
+
+    Estructura de cada cola:
+    - keys/<id>: marca de que la clave ya se encoló (creada en forma exclusiva).
+    - tasks/<id>.json: clave y payload de la tarea.
+    - pending/<id>.<intentos>.<no_antes_de>: tareas disponibles.
+    - leased/<id>.<intentos>.<token>: tareas reservadas; su fecha de modificación es el vencimiento del lease.
+    - done/<id>.json y failed/<id>.json: resultado o error de las tareas terminadas.
+
+    Parámetros:
+    - path (str | Path): Carpeta de la cola.
+    '''
+
+    STATES = ('pending', 'leased', 'done', 'failed')
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def _dir(self, queue, name):
+        folder = self.path / queue / name
+        folder.mkdir(parents=True, exist_ok=True)
+        return folder
+
+    @staticmethod
+    def _task_id(key):
+        return hashlib.sha1(str(key).encode("utf-8")).hexdigest()[:20]
+
+    @staticmethod
+    def _write(path, data):
+        # Escritura atómica: archivo temporal en la misma carpeta y os.replace
+        tmp = path.with_name(f".{path.name}.{uuid4().hex}")
+        tmp.write_text(data, encoding="utf-8")
+        os.replace(tmp, path)
+
+    def _leased_path(self, queue, task):
+        return self._dir(queue, 'leased') / f"{task['id']}.{task['attempts']}.{task['lease_token']}"
+
+    def enqueue(self, queue, key, payload=None):
+        task_id = self._task_id(key)
+        try:
+            fd = os.open(self._dir(queue, 'keys') / task_id, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        os.close(fd)
+
+        self._write(self._dir(queue, 'tasks') / f"{task_id}.json", json.dumps({'key': str(key), 'payload': payload}))
+        (self._dir(queue, 'pending') / f"{task_id}.0.0").touch()
+        return True
+
+    def enqueue_many(self, queue, tasks):
+        return sum(self.enqueue(queue, key, payload) for key, payload in tasks)
+
+    def _claim(self, queue, source, task_id, attempts, lease_seconds):
+        token = uuid4().hex
+        task = {'id': task_id, 'queue': queue, 'attempts': attempts + 1, 'lease_token': token}
+        target = self._leased_path(queue, task)
+        expires = time.time() + lease_seconds
+        try:
+            # El vencimiento se fija antes del rename, para que otro worker no vea el archivo recién reservado como vencido
+            os.utime(source, (expires, expires))
+            os.rename(source, target)
+        except FileNotFoundError:
+            return None # Otro worker la tomó primero
+
+        data = json.loads((self._dir(queue, 'tasks') / f"{task_id}.json").read_text(encoding="utf-8"))
+        task.update(key=data['key'], payload=data['payload'])
+        return task
+
+    def lease(self, queue, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        # worker_id no se guarda: el token del nombre del archivo identifica el lease
+        now = time.time()
+
+        # Leases vencidos: se reasignan, o se marcan como fallidos si agotaron sus intentos
+        for entry in os.scandir(self._dir(queue, 'leased')):
+            try:
+                expired = entry.stat().st_mtime < now
+            except FileNotFoundError:
+                continue
+            if not expired or entry.name.startswith('.'):
+                continue
+            task_id, attempts, _ = entry.name.split('.')
+            if int(attempts) >= max_attempts:
+                self._finish(queue, entry.path, task_id, 'failed', {'error': 'lease expirado'})
+                continue
+            task = self._claim(queue, entry.path, task_id, int(attempts), lease_seconds)
+            if task is not None:
+                return task
+
+        ready = []
+        for entry in os.scandir(self._dir(queue, 'pending')):
+            if entry.name.startswith('.'):
+                continue
+            task_id, attempts, not_before = entry.name.split('.')
+            if int(not_before) / 1000 <= now: # no_antes_de en milisegundos
+                ready.append((int(not_before), entry.name, task_id, int(attempts)))
+
+        for _, name, task_id, attempts in sorted(ready):
+            task = self._claim(queue, self._dir(queue, 'pending') / name, task_id, attempts, lease_seconds)
+            if task is not None:
+                return task
+        return None
+
+    def heartbeat(self, task, lease_seconds=DEFAULT_LEASE_SECONDS):
+        expires = time.time() + lease_seconds
+        try:
+            os.utime(self._leased_path(task['queue'], task), (expires, expires))
+        except FileNotFoundError:
+            return False # El lease se reasignó a otro worker
+        return True
+
+    def _finish(self, queue, source, task_id, state, content):
+        target = self._dir(queue, state) / f"{task_id}.json"
+        try:
+            os.rename(source, target)
+        except FileNotFoundError:
+            return False
+        self._write(target, json.dumps(content))
+        return True
+
+    def complete(self, task, result=None):
+        return self._finish(task['queue'], self._leased_path(task['queue'], task), task['id'], 'done', {'result': result})
+
+    def fail(self, task, error, max_attempts=DEFAULT_MAX_ATTEMPTS, retry_seconds=DEFAULT_RETRY_SECONDS):
+        queue, source = task['queue'], self._leased_path(task['queue'], task)
+        if task['attempts'] >= max_attempts:
+            return self._finish(queue, source, task['id'], 'failed', {'error': str(error)})
+        not_before = int((time.time() + retry_seconds * task['attempts']) * 1000)
+        try:
+            os.rename(source, self._dir(queue, 'pending') / f"{task['id']}.{task['attempts']}.{not_before}")
+        except FileNotFoundError:
+            return False
+        return True
+
+    def next_ready(self, queue):
+        times = [int(entry.name.split('.')[2]) / 1000 for entry in os.scandir(self._dir(queue, 'pending'))
+                 if not entry.name.startswith('.')]
+        return min(times) if times else None
+
+    def stats(self, queue):
+        counts = {}
+        for state in self.STATES:
+            count = sum(1 for entry in os.scandir(self._dir(queue, state)) if not entry.name.startswith('.'))
+            if count:
+                counts[state] = count
+        return counts
+
+    def instance_id(self):
+        marker = self.path / "queue_id"
+        try:
+            fd = os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return marker.read_text(encoding="utf-8").strip()
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(uuid4().hex)
+        return marker.read_text(encoding="utf-8").strip()
+
+    def close(self):
+        pass
+
+
+def open_task_queue(location):
+    '''
+    Abre la cola de tareas indicada por una ubicación: un archivo .sqlite/.sqlite3/.db usa SQLiteTaskQueue (un solo host);
+    cualquier otra ruta se trata como carpeta compartida y usa DirectoryTaskQueue (varias máquinas).
+
+    Parámetros:
+    - location (str | Path): Archivo SQLite o carpeta de la cola.
+
+    Retorna:
+    - objeto con los métodos enqueue, enqueue_many, lease, heartbeat, complete, fail, next_ready, stats, instance_id y close.
+    '''
+
+    if Path(location).suffix.lower() in ('.sqlite', '.sqlite3', '.db'):
+        return SQLiteTaskQueue(location)
+    return DirectoryTaskQueue(location)
+
+
+@contextmanager
+def keep_lease_alive(queue_path, task, lease_seconds=DEFAULT_LEASE_SECONDS):
+    '''
+    Renueva periódicamente el lease de una tarea desde un hilo en segundo plano mientras se procesa.
+
+    Parámetros:
+    - queue_path (str | Path): Ubicación de la cola (ver open_task_queue); el hilo abre su propia conexión.
+    - task (dict): Tarea entregada por el método lease de la cola.
+    - lease_seconds (float): Duración de cada renovación.
+
+    Retorna:
+    - status (dict): Diccionario con 'lost' (bool), True si el lease se perdió durante el procesamiento.
+    '''
+
+    status = {'lost': False}
+    stop = threading.Event()
+
+    def beat():
+        tasks = open_task_queue(queue_path)
+        try:
+            while not stop.wait(lease_seconds / 3):
+                if not tasks.heartbeat(task, lease_seconds):
+                    status['lost'] = True
+                    break
+        finally:
+            tasks.close()
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield status
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_worker(queue_path, queue, handler, worker_id=None, lease_seconds=DEFAULT_LEASE_SECONDS,
+               max_attempts=DEFAULT_MAX_ATTEMPTS, poll_seconds=0, retry_seconds=DEFAULT_RETRY_SECONDS):
+    '''
+    Consume tareas de una cola hasta vaciarla, aplicando handler a cada una.
+
+    Parámetros:
+    - queue_path (str | Path): Ubicación de la cola (ver open_task_queue).
+    - queue (str): Nombre de la cola.
+    - handler (callable): Función handler(payload, lease) que procesa una tarea y retorna su resultado.
+        - lease (dict): Estado del lease ('lost'), para verificar antes de efectos externos, y 'task_ref', referencia
+          estable de la tarea (igual en todos sus intentos) para que los efectos externos sean idempotentes.
+    - worker_id (str): Identificador del worker.
+    - lease_seconds (float): Duración del lease.
+    - max_attempts (int): Cantidad máxima de intentos por tarea.
+    - poll_seconds (float): Si es mayor que 0, espera nuevas tareas en lugar de terminar cuando la cola está vacía.
+      Con 0, el worker igual espera los reintentos pendientes antes de terminar.
+    - retry_seconds (float): Espera base antes de reintentar una tarea fallida (ver fail_task).
+
+    Retorna:
+    - processed (int): Cantidad de tareas completadas por este worker.
+    '''
+
+    import os
+    import socket
+
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    tasks = open_task_queue(queue_path)
+    queue_id = tasks.instance_id()
+    processed = 0
+
+    try:
+        while True:
+            task = tasks.lease(queue, worker_id, lease_seconds, max_attempts)
+            if task is None:
+                ready = tasks.next_ready(queue) # Reintentos en espera
+                if ready is None and poll_seconds <= 0:
+                    break
+                wait = poll_seconds if ready is None else max(ready - time.time(), 0.1)
+                time.sleep(min(wait, poll_seconds) if poll_seconds > 0 else wait)
+                continue
+
+            try:
+                with keep_lease_alive(queue_path, task, lease_seconds) as lease:
+                    lease['task_ref'] = f"{queue_id}:{task['id']}"
+                    result = handler(task['payload'], lease)
+            except Exception as exc:
+                print(f"Tarea {queue}/{task['key']} falló (intento {task['attempts']}): {exc}")
+                tasks.fail(task, exc, max_attempts, retry_seconds)
+                continue
+
+            if tasks.complete(task, result):
+                processed += 1
+    finally:
+        tasks.close()
+
+    return processed
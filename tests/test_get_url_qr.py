@@ -0,0 +1,61 @@
+from get_url_qr import TILE_OVERLAP, TILE_SIZE, iter_tiles
+
+
+def _contained(tiles, x, y, side):
+    return any(tx <= x and ty <= y and x + side <= tx + tw and y + side <= ty + th for tx, ty, tw, th in tiles)
+
+
+def test_tiles_cover_image_edges():
+    tiles = iter_tiles(3000, 4000)
+    assert max(x + w for x, _, w, _ in tiles) == 4000
+    assert max(y + h for _, y, _, h in tiles) == 3000
+    assert all(w <= TILE_SIZE and h <= TILE_SIZE for _, _, w, h in tiles)
+
+
+def test_codes_up_to_overlap_are_inside_a_tile():
+    # Todo código de lado <= TILE_OVERLAP debe quedar completo en algún mosaico, en cualquier posición
+    height, width = 3000, 4000
+    tiles = iter_tiles(height, width)
+    for side in (50, 120, TILE_OVERLAP):
+        for y in range(0, height - side + 1, 37):
+            for x in range(0, width - side + 1, 37):
+                assert _contained(tiles, x, y, side), (x, y, side)
+
+
+def test_codes_larger_than_overlap_can_cross_seams():
+    # Estos casos los cubre la pasada sobre la imagen completa, no los mosaicos
+    assert not _contained(iter_tiles(3000, 4000), 500, 500, 400)
+
+
+def test_small_image_is_single_tile():
+    assert iter_tiles(600, 700) == [(0, 0, 700, 600)]
+
+
+def test_classify_matches_whole_hosts():
+    from get_url_qr import classify_qr_payload
+
+    for url in ("https://menux.com/carta", "https://fenix.com", "https://box.com/s/menu", "http://www.remix.com", "https://sunflow.cl/menu"):
+        assert classify_qr_payload(url) == 'menu', url
+
+    assert classify_qr_payload("https://x.com/resto") == 'social'
+    assert classify_qr_payload("https://www.instagram.com/resto") == 'social'
+    assert classify_qr_payload("https://wa.me/56912345678") == 'whatsapp'
+    assert classify_qr_payload("https://api.whatsapp.com/send?phone=1") == 'whatsapp'
+    assert classify_qr_payload("https://link.mercadopago.com.ar/resto") == 'payment'
+    assert classify_qr_payload("https://www.flow.cl/btn.php?token=1") == 'payment'
+    assert classify_qr_payload("WIFI:S:resto;T:WPA;P:clave;;") == 'wifi'
+    assert classify_qr_payload("hola") == 'text'
+
+
+def test_bare_domains_are_menu_urls():
+    from get_url_qr import classify_qr_payload, payload_url, select_menu_url
+
+    assert classify_qr_payload("menu.fu.do/resto") == 'menu'
+    assert classify_qr_payload("www.resto.cl") == 'menu'
+    assert classify_qr_payload("wa.me/56912345678") == 'whatsapp'
+    assert classify_qr_payload("Mesa 12") == 'text'
+    assert payload_url("1.500") is None
+
+    results = [{'data': "instagram.com/resto", 'kind': 'social'}, {'data': "menu.fu.do/resto", 'kind': 'menu'}]
+    assert select_menu_url(results) == "http://menu.fu.do/resto"
+    assert select_menu_url([{'data': "https://resto.cl/carta", 'kind': 'menu'}]) == "https://resto.cl/carta"
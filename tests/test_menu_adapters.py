@@ -0,0 +1,73 @@
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("bs4")
+
+from menu_adapters import STATIC_MENU_HOSTS, _banned_link, find_adapter, generic_static_menu, run_adapter
+
+
+# Páginas sintéticas escritas a mano con las formas genéricas que lee generic_static_menu (no son capturas de ninguna plataforma)
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+class FakeResponse:
+    def __init__(self, url, text, status_code=200, content_type='text/html; charset=utf-8'):
+        self.url = url
+        self.text = text
+        self.status_code = status_code
+        self.headers = {'Content-Type': content_type}
+
+
+def fixture_response(url, name):
+    return FakeResponse(url, (FIXTURES / name).read_text(encoding="utf-8"))
+
+
+@pytest.mark.parametrize("name", ["next_data_menu.html", "initial_state_menu.html", "static_menu.html"])
+def test_generic_handler_reads_menu_without_browser(name):
+    url = "https://carta.example.com/resto"
+    scrap = generic_static_menu(url, fixture_response(url, name))
+
+    assert scrap['recognized']
+    assert "heineken" in scrap['full_text']
+    assert "torobayo" in scrap['full_text']
+    assert "console" not in scrap['full_text']
+
+
+def test_static_menu_hosts_route_to_the_generic_handler():
+    for host in STATIC_MENU_HOSTS:
+        assert find_adapter(f"https://resto.{host}/carta") is generic_static_menu
+    assert run_adapter("https://resto.fu.do/carta", FakeResponse("https://resto.fu.do/carta", "<p>Cargando...</p>")) is None
+
+
+def test_unregistered_hosts_use_the_browser_path():
+    assert find_adapter("https://notfu.do/carta") is None
+    assert find_adapter("https://barejemplo.cl/carta") is None
+
+
+def test_linktree_follows_only_menu_links(monkeypatch):
+    requests = pytest.importorskip("requests")
+
+    fetched = []
+
+    def fake_get(url, **kwargs):
+        fetched.append(url)
+        return fixture_response(url, "static_menu.html")
+
+    monkeypatch.setattr(requests, "get", fake_get)
+
+    url = "https://linktr.ee/barejemplo"
+    scrap = run_adapter(url, fixture_response(url, "linktree_page.html"))
+
+    assert fetched == ["https://barejemplo.cl/carta"]
+    assert scrap['recognized'] and "heineken" in scrap['full_text']
+
+
+def test_banned_links_match_whole_hosts():
+    for url in ("https://instagram.com/resto", "https://www.instagram.com/resto", "https://wa.me/56900000000",
+                "https://x.com/resto", "https://linktr.ee/s/about", "https://drive.google.com/?tab=oo"):
+        assert _banned_link(url), url
+
+    for url in ("https://menux.com/carta", "https://fenix.com/menu", "https://miwix.com.ar/carta",
+                "https://linktr.ee/barejemplo", "https://drive.google.com/file/d/carta.pdf"):
+        assert not _banned_link(url), url
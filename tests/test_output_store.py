@@ -0,0 +1,32 @@
+import sqlite3
+
+from output_store import iter_pages, open_store, save_scrap
+
+
+SCRAP = {'status': 200, 'content_type': 'text/html', 'data': {'recognized': True, 'full_text': 'Pizza 1.000'}}
+
+
+def test_save_scrap_is_idempotent_per_task(tmp_path):
+    store = open_store(tmp_path / "scraps.sqlite")
+
+    first = save_scrap(store, "https://a.cl", SCRAP, name="a", run_id="r1", task_ref="q:1")
+    retry = save_scrap(store, "https://a.cl", SCRAP, name="a", run_id="r2", task_ref="q:1")
+    other = save_scrap(store, "https://a.cl", SCRAP, name="a", run_id="r2", task_ref="q:2")
+    untracked = [save_scrap(store, "https://a.cl", SCRAP) for _ in range(2)]
+
+    assert retry == first
+    assert other != first
+    assert untracked[0] != untracked[1]
+    assert len(list(iter_pages(store))) == 4
+
+
+def test_open_store_adds_task_ref_to_old_stores(tmp_path):
+    path = tmp_path / "scraps.sqlite"
+    old = sqlite3.connect(path)
+    old.execute("CREATE TABLE pages (id INTEGER PRIMARY KEY AUTOINCREMENT, run_id TEXT, name TEXT, url TEXT NOT NULL, "
+                "final_url TEXT, status INTEGER, content_type TEXT, recognized INTEGER NOT NULL DEFAULT 0, "
+                "started_at REAL, elapsed REAL, text_hash TEXT)")
+    old.close()
+
+    store = open_store(path)
+    assert save_scrap(store, "https://a.cl", SCRAP, task_ref="q:1") == save_scrap(store, "https://a.cl", SCRAP, task_ref="q:1")
@@ -0,0 +1,57 @@
+import pytest
+
+pytest.importorskip("bs4")
+
+from page_cache import canonical_url, conditional_headers, get_cached_page, is_unchanged, open_cache, store_page
+
+
+class FakeResponse:
+    def __init__(self, text, status_code=200, headers=None):
+        self.text = text
+        self.status_code = status_code
+        self.headers = headers or {'Content-Type': 'text/html; charset=utf-8', 'ETag': '"v1"'}
+
+
+SHELL = '<html><body><div id="app"></div><script src="/app.js"></script></body></html>'
+
+
+def test_only_recognized_extractions_are_cached(tmp_path):
+    cache = open_cache(tmp_path / "page_cache.sqlite")
+
+    assert not store_page(cache, "https://app.example.com/resto", FakeResponse(SHELL), {'recognized': False, 'full_text': ''})
+    assert get_cached_page(cache, "https://app.example.com/resto") is None
+
+    assert store_page(cache, "https://app.example.com/resto", FakeResponse(SHELL), {'recognized': True, 'full_text': 'pizza 9.900'})
+    assert get_cached_page(cache, "https://app.example.com/resto")['scrap']['full_text'] == 'pizza 9.900'
+
+
+def test_canonical_url_normalizes_cache_keys():
+    assert canonical_url("HTTPS://Resto.CL:443/carta/?utm_source=qr&b=2&a=1&fbclid=x#precios") == "https://resto.cl/carta?a=1&b=2"
+    assert canonical_url("http://resto.cl:8080") == "http://resto.cl:8080/"
+    assert canonical_url("resto.cl/carta") != canonical_url("resto.cl/otra")
+
+
+def test_canonical_url_keeps_spa_routes():
+    assert canonical_url("https://app.example.com/#/resto-a") != canonical_url("https://app.example.com/#/resto-b")
+    assert canonical_url("https://app.example.com/#!/resto-a") == "https://app.example.com/#!/resto-a"
+    assert canonical_url("https://app.example.com/#menu") == "https://app.example.com/"
+
+
+def test_conditional_headers():
+    assert conditional_headers(None) == {}
+    assert conditional_headers({'etag': '"v1"', 'last_modified': None}) == {'If-None-Match': '"v1"'}
+    assert conditional_headers({'etag': None, 'last_modified': 'Mon, 01 Jan 2024 00:00:00 GMT'}) == {
+        'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT'}
+
+
+def test_is_unchanged(tmp_path):
+    cache = open_cache(tmp_path / "page_cache.sqlite")
+    html = '<html><body><p>Pizza 9.900</p><script>var t = 1;</script></body></html>'
+    store_page(cache, "https://resto.cl/carta", FakeResponse(html), {'recognized': True, 'full_text': 'pizza 9.900'})
+    entry = get_cached_page(cache, "https://resto.cl/carta")
+
+    assert not is_unchanged(None, FakeResponse(html))
+    assert is_unchanged(entry, FakeResponse('', status_code=304))
+    assert is_unchanged(entry, FakeResponse(html.replace('var t = 1;', 'var t = 2;'))) # Scripts no visibles
+    assert not is_unchanged(entry, FakeResponse(html.replace('9.900', '10.900')))
+    assert not is_unchanged(entry, FakeResponse(html, status_code=500))
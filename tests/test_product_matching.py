@@ -0,0 +1,87 @@
+import pytest
+
+pytest.importorskip("bs4")
+process = pytest.importorskip("rapidfuzz.process")
+
+from product_matching import build_catalog, candidate_choices, match_pages, match_windows, text_windows
+
+
+def make_catalog(*names):
+    return build_catalog([{'sku': str(i), 'name': name, 'brand': name.split()[0]} for i, name in enumerate(names)])
+
+
+def test_build_catalog_normalizes_names_and_aliases():
+    catalog = build_catalog([
+        {'sku': '1', 'name': 'Cerveza Cristal', 'aliases': 'Cristal|cristal| '},
+        {'sku': '2', 'name': ' '},
+        {'sku': '3', 'name': 'Pisco Mistral', 'aliases': 'Mistral 35°'},
+    ])
+
+    assert [p['sku'] for p in catalog['products']] == ['1', '3']
+    assert catalog['choices'] == ['cerveza cristal', 'cristal', 'pisco mistral', 'mistral 35']
+    assert catalog['choice_product'] == [0, 0, 1, 1]
+    assert 1 in catalog['index']['cri']
+
+
+def test_candidate_choices_requires_shared_ngrams():
+    catalog = make_catalog('Heineken', 'Corona', 'Kunstmann Torobayo')
+
+    assert candidate_choices(catalog, 'cerveza heineken lata') == [0]
+    assert candidate_choices(catalog, 'papas fritas') == []
+
+
+def test_match_windows_scores_single_windows_with_extract_one(monkeypatch):
+    catalog = make_catalog('Heineken', 'Corona')
+    calls = []
+    monkeypatch.setattr(process, "cdist", lambda *args, **kwargs: calls.append('cdist'))
+
+    best = match_windows(catalog, ['cerveza heineken', 'corona extra', 'papas fritas', 'cerveza heineken'])
+
+    assert calls == []
+    assert best[0] == best[3] == (0, 100)
+    assert best[1] == (1, 100)
+    assert best[2] is None
+
+
+def test_match_windows_groups_windows_with_the_same_candidates(monkeypatch):
+    catalog = make_catalog('Heineken', 'Corona')
+    cdist, calls = process.cdist, []
+
+    def spy(queries, choices, **kwargs):
+        calls.append((list(queries), list(choices)))
+        return cdist(queries, choices, **kwargs)
+
+    monkeypatch.setattr(process, "cdist", spy)
+
+    best = match_windows(catalog, ['heineken lata', 'heineken botella', 'heineken lata'])
+
+    assert calls == [(['heineken lata', 'heineken botella'], ['heineken'])]
+    assert best == [(0, 100), (0, 100), (0, 100)]
+
+
+def test_match_pages_keeps_best_match_per_product():
+    catalog = make_catalog('Heineken', 'Corona')
+
+    matches = match_pages(catalog, ['Heinekn 3.000 Heineken 3.500 Corona 3.900', '', 'papas fritas 2.500'])
+
+    assert [(m['sku'], m['price'], m['score']) for m in matches[0]] == [('0', '3.500', 100), ('1', '3.900', 100)]
+    assert matches[1] == [] and matches[2] == []
+
+
+def test_match_pages_without_prices_uses_word_windows():
+    catalog = make_catalog('Kunstmann Torobayo')
+
+    matches = match_pages(catalog, ['cervezas artesanales kunstmann torobayo y otras'])
+
+    assert matches[0][0]['sku'] == '0' and matches[0][0]['price'] is None
+
+
+def test_container_sizes_are_not_prices():
+    assert text_windows('Cerveza Heineken 330cc $3.500 Corona 355 cc $3.900 Pisco 1,5 lt 9.900') == [
+        ('cerveza heineken 330cc', '$3.500'), ('corona 355 cc', '$3.900'), ('pisco 1,5 lt', '9.900'),
+    ]
+
+    catalog = make_catalog('Heineken 330cc', 'Corona')
+    matches = match_pages(catalog, ['Cerveza Heineken 330cc $3.500 Corona 355cc $3.900'])
+
+    assert {m['product']: m['price'] for m in matches[0]} == {'Heineken 330cc': '$3.500', 'Corona': '$3.900'}
@@ -0,0 +1,145 @@
+import time
+
+import pytest
+
+pytest.importorskip("bs4")
+pytest.importorskip("selenium")
+
+from extraction import html_handler
+from replay_driver import RecordingDriver, ReplayDriver, ReplayMiss, load_archive, save_archive
+
+
+HOME = "https://resto.example/"
+DRINKS = "https://resto.example/bebidas"
+FOOD = [f"Plato {i} ${i + 5}.900" for i in range(10)]
+BEERS = [f"Cerveza {i} ${i + 2}.500" for i in range(10)]
+
+
+class FakeElement:
+    def __init__(self, page, tag, text='', attrs=None, on_click=None):
+        self._page = page
+        self.tag_name = tag
+        self.text = text
+        self._attrs = attrs or {}
+        self._on_click = on_click
+
+    def get_attribute(self, name):
+        if name == 'innerHTML':
+            return self._page.body()
+        return self._attrs.get(name)
+
+    def click(self):
+        if self._on_click:
+            self._on_click()
+
+
+class FakePage:
+    '''
+    Sitio en memoria con el comportamiento de una carta real: un botón que despliega los platos, un enlace a otra página
+    y una página inicial alta, para que el presupuesto de tiempo corte el scroll antes del final.
+    '''
+
+    def __init__(self):
+        self.url = HOME
+        self.history = []
+        self.expanded = False
+        self.scrolls = 0
+
+    def _toggle(self):
+        self.expanded = not self.expanded
+
+    def _elements(self):
+        if self.url == DRINKS:
+            return [FakeElement(self, 'li', text) for text in BEERS]
+        elements = [
+            FakeElement(self, 'button', "Ver carta", on_click=self._toggle),
+            FakeElement(self, 'a', "Bebidas", {'href': DRINKS}),
+        ]
+        if self.expanded:
+            elements += [FakeElement(self, 'li', text) for text in FOOD]
+        return elements
+
+    def body(self):
+        return ''.join(f"<{el.tag_name}>{el.text}</{el.tag_name}>" for el in self._elements())
+
+    @property
+    def current_url(self):
+        return self.url
+
+    @property
+    def page_source(self):
+        return f"<html><body>{self.body()}</body></html>"
+
+    def find_elements(self, by, value):
+        return [el for el in self._elements() if el.tag_name == value]
+
+    def find_element(self, by, value):
+        if value == 'body':
+            return FakeElement(self, 'body')
+        return self.find_elements(by, value)[0]
+
+    def execute_script(self, script, *args):
+        if script.startswith("return document.body.scrollHeight"):
+            return 800 if self.url == DRINKS else 5000
+        self.scrolls += 1
+
+    def get(self, url):
+        self.history.append(self.url)
+        self.url = url
+
+    def back(self):
+        self.url = self.history.pop()
+
+
+class CountingReplayDriver(ReplayDriver):
+    scrolls = 0
+
+    def execute_script(self, script, *args):
+        if not script.startswith("return"):
+            self.scrolls += 1
+        return super().execute_script(script, *args)
+
+
+@pytest.fixture
+def virtual_time(monkeypatch):
+    # Las esperas de la grabación avanzan un reloj simulado en lugar de dormir
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    monkeypatch.setattr(time, "sleep", lambda seconds: now.__setitem__(0, now[0] + seconds))
+    return now
+
+
+@pytest.fixture
+def recording(tmp_path, virtual_time):
+    page = FakePage()
+    recorder = RecordingDriver(page, max_time=4)
+    scrap = html_handler(recorder, 4)
+    save_archive(recorder.archive, tmp_path / "resto.json.gz")
+    return {'scrap': scrap, 'scrolls': page.scrolls, 'archive': load_archive(tmp_path / "resto.json.gz")}
+
+
+def test_replay_reproduces_the_recorded_session(recording):
+    assert recording['scrap']['recognized']
+
+    driver = CountingReplayDriver(recording['archive'], strict=True)
+    scrap = html_handler(driver, recording['archive']['max_time'])
+
+    assert scrap == recording['scrap']
+    assert driver.misses == 0
+
+
+def test_replay_stops_where_the_recording_ran_out_of_time(recording):
+    # Sin esperas, la reproducción recorrería toda la página; con el reloj grabado se detiene en el mismo scroll
+    assert 0 < recording['scrolls'] < 5000 // 500 - 1
+
+    driver = CountingReplayDriver(recording['archive'], strict=True)
+    html_handler(driver, recording['archive']['max_time'])
+
+    assert driver.scrolls == recording['scrolls']
+
+
+def test_strict_replay_fails_when_it_diverges(recording):
+    archive = dict(recording['archive'], clock=recording['archive']['clock'][:2])
+
+    with pytest.raises(ReplayMiss):
+        html_handler(ReplayDriver(archive, strict=True), archive['max_time'])
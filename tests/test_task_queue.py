@@ -0,0 +1,127 @@
+import time
+
+import pytest
+
+from task_queue import DirectoryTaskQueue, SQLiteTaskQueue, keep_lease_alive, open_task_queue, run_worker
+
+
+@pytest.fixture(params=["queue.sqlite", "queue_dir"])
+def location(request, tmp_path):
+    return str(tmp_path / request.param)
+
+
+@pytest.fixture
+def tasks(location):
+    queue = open_task_queue(location)
+    yield queue
+    queue.close()
+
+
+def test_open_task_queue_picks_backend_by_location(tmp_path):
+    assert isinstance(open_task_queue(tmp_path / "q.sqlite"), SQLiteTaskQueue)
+    assert isinstance(open_task_queue(tmp_path / "shared"), DirectoryTaskQueue)
+
+
+def test_enqueue_ignores_duplicate_keys(tasks):
+    assert tasks.enqueue_many('qr', [('a', {'n': 1}), ('b', {'n': 2}), ('a', {'n': 3})]) == 2
+    assert not tasks.enqueue('qr', 'b', {'n': 4})
+    assert tasks.stats('qr') == {'pending': 2}
+
+
+def test_lease_is_exclusive_and_complete_is_token_checked(tasks):
+    tasks.enqueue('qr', 'a', {'n': 1})
+
+    task = tasks.lease('qr', 'w1')
+    assert task['key'] == 'a' and task['payload'] == {'n': 1} and task['attempts'] == 1
+    assert tasks.lease('qr', 'w2') is None
+
+    assert tasks.complete(task, {'ok': True})
+    assert not tasks.complete(task, {'ok': False}) # Segundo registro sin efecto
+    assert not tasks.fail(task, 'tarde')
+    assert tasks.stats('qr') == {'done': 1}
+
+
+def test_expired_lease_is_taken_over(tasks):
+    tasks.enqueue('qr', 'a')
+
+    first = tasks.lease('qr', 'w1', lease_seconds=0.05)
+    time.sleep(0.1)
+    second = tasks.lease('qr', 'w2', lease_seconds=30)
+
+    assert second['key'] == 'a' and second['attempts'] == 2
+    assert second['lease_token'] != first['lease_token']
+    assert not tasks.heartbeat(first)
+    assert not tasks.complete(first, {'worker': 1})
+    assert tasks.complete(second, {'worker': 2})
+
+
+def test_heartbeat_extends_the_lease(tasks):
+    tasks.enqueue('qr', 'a')
+
+    task = tasks.lease('qr', 'w1', lease_seconds=0.05)
+    assert tasks.heartbeat(task, lease_seconds=30)
+    time.sleep(0.1)
+    assert tasks.lease('qr', 'w2') is None
+
+
+def test_failed_task_waits_before_retry(tasks):
+    tasks.enqueue('qr', 'a')
+
+    task = tasks.lease('qr', 'w1')
+    before = time.time()
+    assert tasks.fail(task, 'caído', max_attempts=3, retry_seconds=60)
+
+    assert tasks.lease('qr', 'w1') is None
+    assert tasks.next_ready('qr') >= before + 59
+
+
+def test_task_fails_after_max_attempts(tasks):
+    tasks.enqueue('qr', 'a')
+
+    for attempt in range(1, 3):
+        task = tasks.lease('qr', 'w1')
+        assert task['attempts'] == attempt
+        tasks.fail(task, 'caído', max_attempts=2, retry_seconds=0)
+
+    assert tasks.lease('qr', 'w1') is None
+    assert tasks.next_ready('qr') is None
+    assert tasks.stats('qr') == {'failed': 1}
+
+
+def test_expired_lease_on_last_attempt_fails(tasks):
+    tasks.enqueue('qr', 'a')
+
+    tasks.lease('qr', 'w1', lease_seconds=0.05, max_attempts=1)
+    time.sleep(0.1)
+
+    assert tasks.lease('qr', 'w2', max_attempts=1) is None
+    assert tasks.stats('qr') == {'failed': 1}
+
+
+def test_keep_lease_alive_reports_lost_lease(location, tasks):
+    tasks.enqueue('qr', 'a')
+    task = tasks.lease('qr', 'w1', lease_seconds=0.3)
+
+    with keep_lease_alive(location, task, lease_seconds=0.3) as lease:
+        other = open_task_queue(location)
+        other.complete(task) # Otro proceso cierra la tarea: la renovación siguiente falla
+        other.close()
+        time.sleep(0.25)
+
+    assert lease['lost']
+
+
+def test_run_worker_retries_with_a_stable_task_ref(location, tasks):
+    tasks.enqueue('qr', 'a', {'n': 1})
+    refs = []
+
+    def handler(payload, lease):
+        refs.append(lease['task_ref'])
+        if len(refs) == 1:
+            raise IOError("caído")
+        return {'n': payload['n']}
+
+    assert run_worker(location, 'qr', handler, 'w1', retry_seconds=0.05) == 1
+    assert len(refs) == 2 and refs[0] == refs[1]
+    assert refs[0].startswith(f"{tasks.instance_id()}:")
+    assert tasks.stats('qr') == {'done': 1}